@@ -1,5 +1,11 @@
 from v2.learner_profiler_v2 import LearnerProfiler
-from v2.progress_tracker_v2 import ProgressTracker
+from v2.database import transaction
+from v2.learner_snapshot import LearnerSnapshot
+from v2.progress_tracker_v2 import ProgressTracker, answer_row, get_answer_writer, synced, write_answers
+from v2.rating_engine import RatingEngine
+from v2.knowledge_tracing import TOPIC_SKILL
+from v2.content_graph import SEPARATOR, node_id
+from v2.recommendation_cache import get_recommendation_cache
 from content_manager import ContentManager
 
 class AdaptiveEngine:
@@ -8,15 +14,49 @@ class AdaptiveEngine:
     and adjusts content based on learner performance and profile.
     """
     
-    def __init__(self):
+    def __init__(self, tracker=None):
         self.profiler = LearnerProfiler()
-        self.tracker = ProgressTracker()
+        # Answers go through the tracker's write mode (write_behind or direct)
+        self.tracker = tracker or ProgressTracker()
         self.content_manager = ContentManager()
+        self.ratings = RatingEngine()
+        self.recommendation_cache = get_recommendation_cache()
     
-    def get_recommendations(self, student_id):
-        """Get personalized learning recommendations for a student."""
-        profile = self.profiler.get_profile(student_id)
-        progress = self.tracker.get_student_progress(student_id)
+    def get_recommendations(self, student_id, snapshot=None):
+        """
+        Get personalized learning recommendations for a student.
+        Pass the rerun's LearnerSnapshot to reuse its data instead of querying.
+        
+        Results are cached per learner until their progress_version changes
+        or their next review falls due; the returned list is shared, so
+        treat it as read-only.
+        """
+        if snapshot is not None:
+            version = snapshot.version
+        else:
+            version = self.tracker.get_progress_version(student_id)
+        
+        cached = self.recommendation_cache.get(student_id, version)
+        if cached is not None:
+            return cached
+        
+        recommendations = self._compute_recommendations(student_id, snapshot)
+        self.recommendation_cache.put(
+            student_id,
+            version,
+            recommendations,
+            valid_until=self.tracker.get_next_review_due(student_id)
+        )
+        return recommendations
+    
+    def _compute_recommendations(self, student_id, snapshot=None):
+        """Build recommendations from scratch (see get_recommendations)."""
+        if snapshot is not None:
+            profile = snapshot.profile
+            progress = snapshot.progress
+        else:
+            profile = self.profiler.get_profile(student_id)
+            progress = self.tracker.get_student_progress(student_id)
         
         recommendations = []
         
@@ -52,8 +92,8 @@ class AdaptiveEngine:
         
         # Recommend topics that need improvement
         for topic, scores in progress.get('topic_scores', {}).items():
-            if scores['total'] > 0:
-                accuracy = (scores['correct'] / scores['total']) * 100
+            if scores['attempts'] > 0:
+                accuracy = (scores['correct'] / scores['attempts']) * 100
                 if 40 <= accuracy < 70:
                     recommendations.append({
                         'title': f'Improve {topic} Skills',
@@ -62,6 +102,15 @@ class AdaptiveEngine:
                         'priority': 'High'
                     })
         
+        # Spaced-repetition reviews that are due now
+        for topic, due in self.tracker.get_due_review_counts(student_id).items():
+            recommendations.append({
+                'title': f'Review {topic}',
+                'description': f'{due} {topic} question{"s" if due != 1 else ""} due for review. A quick refresher now keeps them from slipping.',
+                'topic': topic,
+                'priority': 'High'
+            })
+        
         # Default recommendation if none
         if not recommendations:
             recommendations.append({
@@ -75,118 +124,163 @@ class AdaptiveEngine:
     
     def get_next_steps(self, student_id, current_topic, accuracy):
         """Get next steps after completing a quiz."""
-        profile = self.profiler.get_profile(student_id)
-        progress = self.tracker.get_student_progress(student_id)
-        
         if accuracy >= 80:
-            # High performance - suggest advanced content
+            # High performance - move on once BKT agrees the topic is mastered
+            if self.is_mastered(student_id, current_topic):
+                suggested = self._get_advanced_topics(current_topic)
+            else:
+                suggested = [current_topic] + self._get_advanced_topics(current_topic)
             return {
                 'message': f'🎉 Excellent work! You scored {accuracy:.1f}% on {current_topic}. You\'re ready for more challenging content!',
                 'action': 'challenge',
-                'suggested_topics': self._get_advanced_topics(current_topic)
+                'suggested_topics': suggested,
+                'next_subtopic': self.next_subtopic(student_id, current_topic)
             }
         elif accuracy >= 60:
             # Moderate performance - suggest practice
             return {
                 'message': f'👍 Good job! You scored {accuracy:.1f}% on {current_topic}. A bit more practice will help you master this topic.',
                 'action': 'practice',
-                'suggested_topics': [current_topic]
+                'suggested_topics': [current_topic],
+                'next_subtopic': self.next_subtopic(student_id, current_topic)
             }
         else:
             # Low performance - suggest review
             return {
                 'message': f'📚 You scored {accuracy:.1f}% on {current_topic}. Don\'t worry! Review the basics and try again. Learning takes time!',
                 'action': 'review',
-                'suggested_topics': self._get_review_topics(current_topic)
+                'suggested_topics': self._get_review_topics(current_topic),
+                'next_subtopic': self.next_subtopic(student_id, current_topic)
             }
     
     def _get_advanced_topics(self, current_topic):
-        """Get advanced topics related to current topic."""
-        topic_map = {
-            'Mathematics': ['Science', 'Programming'],
-            'Science': ['Programming', 'Mathematics'],
-            'Programming': ['Mathematics', 'Science'],
-            'Languages': ['Programming']
-        }
-        return topic_map.get(current_topic, ['Mathematics', 'Science'])
+        """Topics the current topic unlocks in the content graph (else the next ones in order)."""
+        graph = self.content_manager.graph
+        unlocked = graph.next_topics.get(current_topic)
+        if unlocked:
+            return unlocked
+        return [t for t in graph.topic_order if t != current_topic][:2]
     
     def _get_review_topics(self, current_topic):
         """Get review topics (same topic for practice)."""
         return [current_topic]
     
-    def get_learning_path(self, student_id):
-        """Generate a personalized learning path for the student."""
-        profile = self.profiler.get_profile(student_id)
-        progress = self.tracker.get_student_progress(student_id)
-        
-        # Get all topics
-        all_topics = self.content_manager.get_available_topics()
-        attempted_topics = set(progress.get('topic_scores', {}).keys())
+    def _mastered_mask(self, student_id):
+        """Boolean mask over the content graph of the learner's mastered skills."""
+        mastered = set()
+        for topic, subtopic in self.tracker.get_mastered_skills(student_id):
+            mastered.add(node_id(topic, subtopic))
+            # A mastered topic covers its subtopics, even if they were never tagged
+            if subtopic == TOPIC_SKILL:
+                mastered.update(
+                    node_id(topic, s) for s in self.content_manager.topics.get(topic, {}).get('subtopics', [])
+                )
+        return self.content_manager.graph.mastered_mask(mastered)
+    
+    def get_learning_path(self, student_id, target=None, limit=5):
+        """
+        Personalized learning path: unmastered topics/subtopics in prerequisite
+        order (only those leading to `target`, if given), then mastered topics.
+        """
+        graph = self.content_manager.graph
+        mastered = self._mastered_mask(student_id)
         
         learning_path = []
+        for nid, ready in graph.learning_path(mastered, target=target, limit=limit):
+            topic, _, subtopic = nid.partition(SEPARATOR)
+            if not subtopic:
+                description = f'Practice {topic} until it is mastered'
+            elif ready:
+                description = f'Learn {subtopic} in {topic}'
+            else:
+                description = f'{subtopic} in {topic} - unlocks after its prerequisites'
+            learning_path.append({
+                'topic': topic,
+                'subtopic': subtopic or None,
+                'description': description,
+                'ready': ready,
+                'completed': False,
+                'order': len(learning_path) + 1
+            })
         
-        # Start with unattempted topics
-        for topic in all_topics:
-            if topic not in attempted_topics:
+        # Fill remaining slots with mastered topics
+        for topic in graph.topic_order:
+            if len(learning_path) >= limit or target is not None:
+                break
+            if mastered[graph.index[topic]]:
                 learning_path.append({
                     'topic': topic,
-                    'description': f'Learn the fundamentals of {topic}',
-                    'completed': False,
+                    'subtopic': None,
+                    'description': f'Mastered {topic} - Great job!',
+                    'ready': True,
+                    'completed': True,
                     'order': len(learning_path) + 1
                 })
         
-        # Add topics that need improvement
-        for topic, scores in progress.get('topic_scores', {}).items():
-            if scores['total'] > 0:
-                accuracy = (scores['correct'] / scores['total']) * 100
-                if accuracy < 80:
-                    learning_path.append({
-                        'topic': topic,
-                        'description': f'Practice and improve your {topic} skills',
-                        'completed': False,
-                        'order': len(learning_path) + 1
-                    })
-                else:
-                    learning_path.append({
-                        'topic': topic,
-                        'description': f'Mastered {topic} - Great job!',
-                        'completed': True,
-                        'order': len(learning_path) + 1
-                    })
+        return learning_path
+    
+    def is_mastered(self, student_id, topic, subtopic=TOPIC_SKILL):
+        """knowledge_tracing.is_mastered for one skill ("" is the topic as a whole)."""
+        return (topic, subtopic) in self.tracker.get_mastered_skills(student_id, topic)
+    
+    def next_subtopic(self, student_id, topic):
+        """First unmastered subtopic of a topic in prerequisite order, preferring ready ones."""
+        graph = self.content_manager.graph
+        if topic not in graph.index:
+            return None
+        
+        mastered = self._mastered_mask(student_id)
+        prefix = topic + SEPARATOR
+        for nid in graph.frontier(mastered):
+            if nid.startswith(prefix):
+                return nid[len(prefix):]
         
-        return learning_path[:5]  # Return top 5 recommendations
+        # Nothing ready yet: the first unmastered subtopic on the way to the topic
+        for nid, _ in graph.learning_path(mastered, target=topic):
+            if nid.startswith(prefix):
+                return nid[len(prefix):]
+        return None
     
     def adapt_difficulty(self, student_id, topic):
-        """Determine appropriate difficulty level for a student on a topic."""
-        profile = self.profiler.get_profile(student_id)
-        progress = self.tracker.get_student_progress(student_id)
-        
-        # Check topic-specific performance
-        topic_scores_dict = progress.get('topic_scores', {})
-        if topic in topic_scores_dict:
-            topic_scores = topic_scores_dict[topic]
-            if topic_scores.get('total', 0) > 0:
-                accuracy = (topic_scores['correct'] / topic_scores['total']) * 100
-                
-                if accuracy >= 85:
-                    return 'Hard'
-                elif accuracy < 50:
-                    return 'Easy'
-                else:
-                    return 'Medium'
+        """
+        Determine appropriate difficulty level for a student on a topic.
+        The level is kept up to date as answers are recorded, so this is
+        normally a single keyed lookup.
+        """
+        level = self.tracker.get_topic_difficulty(student_id, topic)
+        if level is not None:
+            return level
+        
+        level, from_answers = self._derive_difficulty(student_id, topic)
+        # Answers that predate the persisted level: store it once
+        if from_answers:
+            self.tracker.set_topic_difficulty(student_id, topic, level)
+        return level
+    
+    def _derive_difficulty(self, student_id, topic):
+        """(level, based_on_topic_answers) computed from scratch."""
+        # Topic mastered (BKT, over enough answers): go straight to the top band
+        if self.is_mastered(student_id, topic):
+            return 'Hard', True
+        
+        # Keyed lookup of the learner's Elo ability on this topic
+        ability = self.tracker.get_topic_ability(student_id, topic)
+        if ability and ability[1] > 0:
+            return self.ratings.difficulty_for(ability[0]), True
+        
+        # Answers recorded before ratings existed: topic rollup accuracy
+        topic_progress = self.tracker.get_topic_progress(student_id, topic)
+        if topic_progress['attempts'] > 0:
+            return self.decide_difficulty(topic_progress['accuracy']), True
         
         # Use overall profile
-        average_accuracy = profile.get('average_accuracy', 0)
-        if average_accuracy >= 80:
-            return 'Hard'
-        elif average_accuracy < 50:
-            return 'Easy'
-        else:
-            return 'Medium'
+        profile = self.profiler.get_profile(student_id)
+        return self.decide_difficulty(profile.get('average_accuracy', 0)), False
     
-    def should_show_hint(self, student_id, topic, question_attempts):
+    def should_show_hint(self, student_id, topic, question_attempts, profile=None):
         """Determine if a hint should be shown based on learner profile."""
-        profile = self.profiler.get_profile(student_id)
+        if profile is None:
+            profile = self.profiler.get_profile(student_id)
         
         # Show hints for struggling learners or after multiple attempts
         if profile['confidence'] == 'Low' or question_attempts >= 2:
@@ -194,9 +288,10 @@ class AdaptiveEngine:
         
         return False
     
-    def get_personalized_feedback(self, student_id, is_correct, response_time):
+    def get_personalized_feedback(self, student_id, is_correct, response_time, profile=None):
         """Generate personalized feedback based on performance."""
-        profile = self.profiler.get_profile(student_id)
+        if profile is None:
+            profile = self.profiler.get_profile(student_id)
         
         if is_correct:
             if response_time < 30:
@@ -209,6 +304,57 @@ class AdaptiveEngine:
             else:
                 return "📚 Not quite right, but that's okay! Take your time to understand the concept better."
 
+    def submit_answer(
+        self, student_id, topic, is_correct, response_time,
+        question_id=None, difficulty=None, subtopic=None, question_attempts=1
+    ):
+        """
+        Record one quiz answer and compute everything the quiz page needs
+        after it, in one transaction: the snapshot's version and the rows it
+        reads come from the same commit.
+        
+        With a write-behind tracker the answer is queued (concurrent submits
+        share group commits) and the transaction only reads; otherwise the
+        answer is written in that transaction too. Either way the learner's
+        queued answers are waited for once, before BEGIN, and the reads
+        inside do not wait again.
+        
+        Returns {"correct", "feedback", "show_hint", "next_difficulty",
+        "snapshot"}. The snapshot is tagged with the post-answer
+        progress_version, so LearnerSnapshot.load on the next rerun
+        returns it without touching the database.
+        """
+        row = answer_row(
+            student_id, topic, is_correct, response_time,
+            question_id, difficulty, subtopic
+        )
+        if self.tracker.write_behind:
+            get_answer_writer().submit(row)
+        
+        with synced(student_id), transaction() as conn:
+            if not self.tracker.write_behind:
+                write_answers(conn, [row])
+            snapshot = LearnerSnapshot.read(
+                student_id,
+                self.tracker.get_progress_version(student_id),
+                self.tracker,
+                self.profiler
+            )
+            next_difficulty = self.adapt_difficulty(student_id, topic)
+        
+        profile = snapshot.profile
+        return {
+            'correct': bool(is_correct),
+            'feedback': self.get_personalized_feedback(
+                student_id, is_correct, response_time, profile=profile
+            ),
+            'show_hint': self.should_show_hint(
+                student_id, topic, question_attempts, profile=profile
+            ),
+            'next_difficulty': next_difficulty,
+            'snapshot': snapshot
+        }
+    
     def decide_difficulty(self, accuracy):
         if accuracy >= 80:
             return "Hard"
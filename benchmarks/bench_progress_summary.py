@@ -0,0 +1,95 @@
+"""
+Benchmark: ProgressTracker.get_student_progress vs. history size.
+
+Seeds a throwaway database with N answers for one learner and times the
+single-query summary (rollup + window aggregates) against the legacy
+full-history scan it replaced. The summary should stay flat as N grows.
+
+Usage:
+    python benchmarks/bench_progress_summary.py [N ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+# -------------------------------
+# PATH FIX (run from anywhere)
+# -------------------------------
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from v2 import database
+from v2.progress_tracker_v2 import ProgressTracker, write_answers
+
+TOPICS = ["Mathematics", "Science", "Programming", "Languages"]
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 500_000]
+REPEATS = 200
+
+
+def seed(n, student_id=1):
+    rng = random.Random(n)
+    base = 1_700_000_000
+    rows = [
+        (
+            student_id,
+            rng.choice(TOPICS),
+            100 if rng.random() < 0.7 else 0,
+            rng.uniform(5, 120),
+            None,
+            base + i,
+            None,
+            None,
+            None
+        )
+        for i in range(n)
+    ]
+    with database.transaction() as conn:
+        write_answers(conn, rows)
+
+
+def legacy_summary(student_id):
+    """The pre-rollup implementation: fetch every answer, aggregate in Python."""
+    with database.connection() as conn:
+        rows = conn.execute(
+            "SELECT topic, accuracy FROM progress WHERE user_id = ?",
+            (student_id,)
+        ).fetchall()
+
+    topic_scores = {}
+    for topic, accuracy in rows:
+        t = topic_scores.setdefault(topic, {"attempts": 0, "correct": 0})
+        t["attempts"] += 1
+        if accuracy == 100:
+            t["correct"] += 1
+    return sum(r[1] for r in rows) / len(rows), topic_scores
+
+
+def timeit(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def main(sizes):
+    tracker = ProgressTracker()
+    print(f"{'rows':>10}  {'summary (us)':>13}  {'legacy scan (us)':>17}")
+
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DB_NAME = os.path.join(tmp, "bench.db")
+            database.init_db()
+            seed(n)
+
+            fast = timeit(lambda: tracker.get_student_progress(1), REPEATS)
+            slow = timeit(lambda: legacy_summary(1), max(1, REPEATS // 20))
+
+            print(f"{n:>10,}  {fast:>13.1f}  {slow:>17.1f}")
+            database.close_all()
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
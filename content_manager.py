@@ -1,7 +1,16 @@
-import random
 import json
 import os
 
+import numpy as np
+
+from v2.content_graph import ContentGraph
+from v2.content_journal import delete_op, get_content_journal, put_op
+from v2.question_store import CUSTOM_CONTENT_FILE, bank_sources, get_question_store, question_id, source_stamp
+from v2.spaced_repetition import review_quota
+
+# Topics, subtopics and their prerequisites (the content graph), as data
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content_graph.json")
+
 
 class ContentManager:
     """
@@ -10,140 +19,84 @@ class ContentManager:
     """
 
     def __init__(self):
-        self.content_file = "content_data.json"
+        self.content_file = CUSTOM_CONTENT_FILE
 
         # -------------------------------
-        # TOPICS METADATA
+        # TOPICS METADATA + PREREQUISITE GRAPH
         # -------------------------------
+        with open(CATALOG_FILE, "r", encoding="utf-8") as f:
+            self.catalog = json.load(f)
+
         self.topics = {
-            "Mathematics": {
-                "title": "Mathematics Fundamentals",
-                "description": "Learn core mathematical concepts including algebra, geometry, and calculus.",
-                "subtopics": ["Fractions", "Algebra", "Geometry", "Calculus"],
-            },
-            "Science": {
-                "title": "Science Essentials",
-                "description": "Explore physics, chemistry, biology, and environmental science.",
-                "subtopics": ["Physics", "Chemistry", "Biology", "Climate Change"],
-            },
-            "Programming": {
-                "title": "Programming Basics",
-                "description": "Master programming fundamentals and problem-solving with code.",
-                "subtopics": ["Python Basics", "Data Structures", "Algorithms", "Web Development"],
-            },
-            "Languages": {
-                "title": "Language Learning",
-                "description": "Improve your language skills with interactive lessons.",
-                "subtopics": ["Vocabulary", "Grammar", "Reading Comprehension", "Writing"],
-            },
+            topic: {
+                "title": spec["title"],
+                "description": spec["description"],
+                "subtopics": list(spec.get("subtopics", {})),
+            }
+            for topic, spec in self.catalog.items()
         }
+        self.graph = ContentGraph.from_catalog(self.catalog)
 
         # -------------------------------
-        # QUESTION BANK
+        # QUESTION BANK (shared, indexed) + CUSTOM CONTENT EDIT JOURNAL
         # -------------------------------
-        self.questions = self._initialize_questions()
-        self._load_content_from_disk()
+        self.store = get_question_store()
+        self.journal = get_content_journal(self.content_file)
+        self.rng = np.random.default_rng()
 
     # =====================================================
     # INTERNAL HELPERS
     # =====================================================
 
-    def _initialize_questions(self):
-        """Initial hardcoded question bank."""
-        return {
-            "Mathematics": {
-                "Fractions": [
-                    {
-                        "question": "What is 1/2 + 1/4?",
-                        "options": ["1/4", "2/4", "3/4", "1"],
-                        "correct_answer": "3/4",
-                        "difficulty": "Easy",
-                        "explanation": "1/2 = 2/4 → 2/4 + 1/4 = 3/4",
-                    },
-                    {
-                        "question": "What is 2/3 × 3/4?",
-                        "options": ["5/7", "6/12", "1/2", "2/3"],
-                        "correct_answer": "1/2",
-                        "difficulty": "Medium",
-                        "explanation": "Multiply numerators and denominators → 6/12 = 1/2",
-                    },
-                ],
-                "Algebra": [
-                    {
-                        "question": "Solve for x: 2x + 5 = 13",
-                        "options": ["x = 3", "x = 4", "x = 5", "x = 6"],
-                        "correct_answer": "x = 4",
-                        "difficulty": "Easy",
-                        "explanation": "2x = 8 → x = 4",
-                    }
-                ],
-            },
-            "Science": {
-                "Climate Change": [
-                    {
-                        "question": "What is the primary cause of global warming?",
-                        "options": [
-                            "Increased solar radiation",
-                            "Greenhouse gas emissions",
-                            "Ocean currents",
-                            "Volcanic activity",
-                        ],
-                        "correct_answer": "Greenhouse gas emissions",
-                        "difficulty": "Easy",
-                        "explanation": "Greenhouse gases trap heat in the atmosphere.",
-                    },
-                    {
-                        "question": "Which is NOT renewable?",
-                        "options": ["Solar", "Wind", "Coal", "Hydroelectric"],
-                        "correct_answer": "Coal",
-                        "difficulty": "Easy",
-                        "explanation": "Coal is a fossil fuel.",
-                    },
-                ]
-            },
-            "Programming": {
-                "Python Basics": [
-                    {
-                        "question": "Output of print(2 + 3 * 4)?",
-                        "options": ["20", "14", "24", "Error"],
-                        "correct_answer": "14",
-                        "difficulty": "Easy",
-                        "explanation": "Multiplication first → 2 + 12 = 14",
-                    }
-                ]
-            },
-            "Languages": {
-                "Reading Comprehension": [
-                    {
-                        "question": "Main idea of a passage on exercise benefits?",
-                        "options": [
-                            "Exercise is difficult",
-                            "Exercise has health benefits",
-                            "Exercise is expensive",
-                            "Exercise is time-consuming",
-                        ],
-                        "correct_answer": "Exercise has health benefits",
-                        "difficulty": "Easy",
-                        "explanation": "The passage focuses on benefits.",
-                    }
-                ]
-            },
-        }
-
-    def _load_content_from_disk(self):
-        """Load custom content if file exists."""
-        if os.path.exists(self.content_file):
-            try:
-                with open(self.content_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.questions.update(data.get("questions", {}))
-            except Exception:
-                pass
+    def export_nested(self):
+        """
+        Whole bank as {topic: {subtopic: [question dicts]}}. Reads every row;
+        for export only, quizzes go through the store's indexes.
+        """
+        return self.store.to_nested()
 
     def save_content(self):
-        """Persist content to disk."""
-        with open(self.content_file, "w", encoding="utf-8") as f:
-            json.dump({"questions": self.questions}, f, indent=2)
+        """
+        Compact custom content: fold the edit journal into a new snapshot
+        (temp file + atomic rename). Edits are already durable once made;
+        this only bounds the journal's length.
+        """
+        self.journal.compact()
+        self.store.mark_built(source_stamp(*bank_sources(custom_file=self.content_file)))
+
+    def _edit(self, ops):
+        """Journal edits (one append), then apply them to the bank in place."""
+        self.journal.append(ops)
+        self.store.apply(ops, source_stamp(*bank_sources(custom_file=self.content_file)))
+        if self.journal.needs_compaction():
+            self.save_content()
+
+    # =====================================================
+    # AUTHORING
+    # =====================================================
+
+    def add_question(self, topic, question, subtopic=None):
+        """Add (or replace, by topic + question text) one question; returns its id."""
+        return self.add_questions([dict(question, topic=topic, subtopic=subtopic)])[0]
+
+    def add_questions(self, records):
+        """
+        Bulk add/replace question records (topic, subtopic, question, options,
+        correct_answer, difficulty, explanation). Costs O(len(records)),
+        however large the bank. Returns the question ids.
+        """
+        ops = [put_op(r) for r in records]
+        if ops:
+            self._edit(ops)
+        return [question_id(op["topic"], op["question"]) for op in ops]
+
+    def remove_question(self, qid):
+        """Delete a question (base bank or custom) by id; False if it does not exist."""
+        q = self.store.get(qid)
+        if q is None:
+            return False
+        self._edit([delete_op(q.topic, q.text)])
+        return True
 
     # =====================================================
     # PUBLIC API
@@ -177,42 +130,39 @@ class ContentManager:
         student_id=None,
         difficulty="Medium",
         num_questions=5,
+        review_ids=(),
     ):
         """
         Generate quiz questions filtered by difficulty.
         This FIXES your crash permanently.
+        Questions whose id is in `review_ids` (due reviews) come first, up
+        to review_quota(num_questions) of them.
         """
 
-        if topic not in self.questions:
+        topic_ids = self.store.ids(topic)
+        if not len(topic_ids):
             return []
 
-        # Collect questions by difficulty
-        filtered = []
-        for _, q_list in self.questions[topic].items():
-            filtered.extend(
-                [q for q in q_list if q.get("difficulty") == difficulty]
-            )
-
-        # Fallback: if not enough difficulty-specific questions
-        if len(filtered) < num_questions:
-            filtered = []
-            for _, q_list in self.questions[topic].items():
-                filtered.extend(q_list)
-
-        if not filtered:
-            return []
-
-        return random.sample(
-            filtered,
-            min(num_questions, len(filtered)),
+        # Due reviews of this topic, most overdue first
+        due = self.store.get_many(list(dict.fromkeys(review_ids)))
+        reviews = [qid for qid, q in due.items() if q.topic == topic][:review_quota(num_questions)]
+        remaining = num_questions - len(reviews)
+
+        # Index lookup; fall back to the whole topic if the level is too thin
+        candidates = self.store.ids(topic, difficulty)
+        if reviews:
+            candidates = candidates[~np.isin(candidates, reviews)]
+        if len(candidates) < remaining:
+            candidates = topic_ids[~np.isin(topic_ids, reviews)] if reviews else topic_ids
+
+        picked = self.rng.choice(
+            candidates, min(remaining, len(candidates)), replace=False
+        ).tolist()
+
+        return (
+            [dict(q, review=True) for q in self.store.as_dicts(reviews)]
+            + self.store.as_dicts(picked)
         )
 
     def get_questions_by_difficulty(self, topic, difficulty):
-        if topic not in self.questions:
-            return []
-
-        result = []
-        for _, q_list in self.questions[topic].items():
-            result.extend([q for q in q_list if q.get("difficulty") == difficulty])
-
-        return result
+        return self.store.as_dicts(self.store.ids(topic, difficulty).tolist())
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from v2.adaptive_testing import (
+    MAX_ITEMS, MIN_ITEMS, SE_THRESHOLD, CATSession, ItemInformationTable, prior_for
+)
+
+DIFFICULTIES = [-1.0] * 20 + [0.0] * 20 + [1.0] * 20
+
+
+@pytest.fixture
+def table():
+    return ItemInformationTable(list(range(len(DIFFICULTIES))), DIFFICULTIES)
+
+
+def administer(session, answer):
+    while True:
+        qid = session.next_item()
+        if qid is None:
+            return session
+        session.record(qid, answer(qid))
+
+
+def test_cold_start_stops_early(table):
+    rng = np.random.default_rng(7)
+    lengths = []
+    for _ in range(100):
+        theta = rng.normal()
+        session = administer(
+            CATSession(table),
+            lambda q: rng.random() < 1 / (1 + np.exp(DIFFICULTIES[q] - theta))
+        )
+        lengths.append(len(session.administered))
+        assert MIN_ITEMS <= len(session.administered) <= MAX_ITEMS
+
+    # The stopping rule, not the cap, ends most tests
+    assert np.mean(np.array(lengths) < MAX_ITEMS) > 0.9
+
+
+def test_stops_on_precision(table):
+    session = administer(CATSession(table), lambda q: q % 2 == 0)
+    assert len(session.administered) < MAX_ITEMS
+    assert session.standard_error < SE_THRESHOLD
+
+
+def test_never_stops_before_min_items(table):
+    session = CATSession(table, prior_sd=0.1)    # already precise
+    assert not session.done
+    administer(session, lambda q: True)
+    assert len(session.administered) == MIN_ITEMS
+
+
+def test_estimate_follows_answers(table):
+    right = administer(CATSession(table), lambda q: True)
+    wrong = administer(CATSession(table), lambda q: False)
+    assert right.theta > 0 > wrong.theta
+
+
+def test_prior_for_rated_and_unrated():
+    assert prior_for(None) == (0.0, 1.0)
+    mean, sd = prior_for((1.5, 100))
+    assert mean == 1.5 and sd == pytest.approx(0.7)
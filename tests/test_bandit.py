@@ -0,0 +1,32 @@
+import numpy as np
+
+from v2.bandit import PRIOR_ALPHA, ThompsonSelector
+
+
+def test_choose_on_empty_selector():
+    selector = ThompsonSelector(seed=0)
+    assert selector.choose([11, 12, 13]) in (0, 1, 2)
+
+
+def test_choose_with_unknown_ids():
+    selector = ThompsonSelector(seed=0)
+    selector.add_pool(("T", "Easy"), [1, 2])
+    assert selector.choose([99]) == 0
+    assert selector.choose([99, 2, 100]) in (0, 1, 2)
+
+
+def test_choose_prefers_item_near_target():
+    selector = ThompsonSelector(seed=0)
+    selector.add_pool(("T", "Easy"), [1, 2])
+    # Item 1 is always answered right, item 2 about 70% of the time
+    selector.alpha[:] = [PRIOR_ALPHA + 200, PRIOR_ALPHA + 140]
+    selector.beta[:] = [1.0, 61.0]
+    picks = [selector.choose([1, 2]) for _ in range(50)]
+    assert np.mean(picks) > 0.9
+
+
+def test_select_empty_pool():
+    selector = ThompsonSelector(seed=0)
+    assert selector.select(("T", "Easy")) is None
+    selector.add_pool(("T", "Easy"), [])
+    assert selector.select(("T", "Easy")) is None
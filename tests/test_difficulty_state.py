@@ -0,0 +1,56 @@
+import pytest
+
+from v2.difficulty_state import HARD_EXIT, LEVELS, DifficultyState
+from v2.rating_engine import DIFFICULTY_PRIORS, RatingEngine
+
+LOW = min(DIFFICULTY_PRIORS.values()) - 3.0     # rating whose band is Easy
+MID = DIFFICULTY_PRIORS["Medium"] + 0.85        # rating whose band is Medium
+HIGH = max(DIFFICULTY_PRIORS.values()) + 3.0    # rating whose band is Hard
+
+
+@pytest.fixture
+def state():
+    return DifficultyState()
+
+
+def test_bands_of_the_test_ratings():
+    ratings = RatingEngine()
+    assert ratings.difficulty_for(LOW) == "Easy"
+    assert ratings.difficulty_for(MID) == "Medium"
+    assert ratings.difficulty_for(HIGH) == "Hard"
+
+
+def test_first_level_is_the_target(state):
+    assert state.level_for(False, LOW) == "Easy"
+    assert state.level_for(True, LOW) == "Hard"
+
+
+def test_moves_one_band_per_update(state):
+    assert state.level_for(True, LOW, previous="Easy") == "Medium"
+    assert state.level_for(True, LOW, previous="Medium") == "Hard"
+    assert state.level_for(False, LOW, previous="Hard", mastery=0.5) == "Medium"
+    assert state.level_for(False, HIGH, previous="Easy") == "Medium"
+
+
+def test_hard_is_kept_above_the_exit_threshold(state):
+    # One miss after mastery: no longer "mastered", Elo down to Medium
+    assert state.level_for(False, MID, previous="Hard", mastery=HARD_EXIT + 0.05) == "Hard"
+    assert state.level_for(False, MID, previous="Hard", mastery=HARD_EXIT - 0.05) == "Medium"
+    # Saturated BKT does not hold Hard once Elo falls to Easy
+    assert state.level_for(False, LOW, previous="Hard", mastery=1.0) == "Medium"
+    # The exit band only applies to learners already at Hard
+    assert state.level_for(False, MID, previous="Medium", mastery=0.9) == "Medium"
+
+
+def test_never_jumps_between_easy_and_hard(state):
+    previous, seen = None, []
+    for mastered, rating, mastery in [
+        (False, LOW, 0.3), (True, HIGH, 0.96), (False, LOW, 0.7),
+        (True, HIGH, 0.97), (False, LOW, 0.2), (False, LOW, 0.2),
+    ]:
+        level = state.level_for(mastered, rating, previous, mastery)
+        if previous is not None:
+            assert abs(LEVELS.index(level) - LEVELS.index(previous)) <= 1
+        previous = level
+        seen.append(level)
+    assert seen[0] == "Easy" and "Medium" in seen
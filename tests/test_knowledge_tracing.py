@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from v2.knowledge_tracing import (
+    DEFAULT_PARAMS, MIN_OBSERVATIONS, fit, is_mastered, observe, replay
+)
+
+
+def run(answers, params=DEFAULT_PARAMS):
+    p_init, *rest = params
+    p = p_init
+    for correct in answers:
+        p = float(observe(p, correct, *rest))
+    return p
+
+
+def test_observe_known_values():
+    # No learning: plain Bayes on one answer
+    assert observe(0.5, True, 0.0, 0.1, 0.2) == pytest.approx(0.45 / 0.55)
+    assert observe(0.5, False, 0.0, 0.1, 0.2) == pytest.approx(0.05 / 0.45)
+    # Learning transition applied after conditioning
+    assert observe(0.5, True, 0.2, 0.1, 0.2) == pytest.approx(0.45 / 0.55 + (0.1 / 0.55) * 0.2)
+
+
+def test_observe_is_vectorized():
+    p = observe(np.array([0.2, 0.2]), np.array([True, False]), 0.1, 0.15, 0.15)
+    assert p[0] == pytest.approx(run([True], (0.2, 0.1, 0.15, 0.15)))
+    assert p[1] == pytest.approx(run([False], (0.2, 0.1, 0.15, 0.15)))
+
+
+def test_replay_matches_sequential_observe():
+    a = [False, True, True, False, True, True]
+    b = [True, True, False]
+    seq = np.r_[np.zeros(len(a), int), np.ones(len(b), int)]
+
+    mastery, loglik = replay(seq, a + b, *DEFAULT_PARAMS)
+    assert mastery == pytest.approx([run(a), run(b)])
+    assert np.shape(loglik) == ()
+
+
+def test_replay_evaluates_parameter_grids():
+    seq, correct = [0, 0, 1], [True, False, True]
+    grid = [np.array([[0.1], [0.3]]), 0.1, 0.15, 0.15]
+    mastery, loglik = replay(seq, correct, *grid)
+    assert mastery.shape == (2, 2) and loglik.shape == (2,)
+    assert mastery[1] == pytest.approx(replay(seq, correct, 0.3, 0.1, 0.15, 0.15)[0])
+
+
+def test_fit_keeps_guess_below_knowing():
+    rng = np.random.default_rng(0)
+    seq = np.repeat(np.arange(50), 20)
+    params, mastery = fit(seq, rng.random(len(seq)) < 0.7)
+    assert params[3] < 1 - params[2]
+    assert mastery.shape == (50,)
+
+
+def test_short_lucky_run_is_not_mastery():
+    answers = [False, True, True, False, True, True]
+    assert not is_mastered(run(answers), len(answers), sum(answers))
+
+
+def test_two_thirds_accuracy_is_not_mastery_however_long():
+    answers = [False, True, True] * 20
+    p = run(answers)
+    assert p >= 0.95            # BKT alone drifts up...
+    assert not is_mastered(p, len(answers), sum(answers))   # ...the gates do not
+
+
+def test_consistent_success_is_mastery():
+    answers = [True] * MIN_OBSERVATIONS
+    assert is_mastered(run(answers), len(answers), sum(answers))
+    assert not is_mastered(run(answers[:-1]), len(answers) - 1, len(answers) - 1)
@@ -0,0 +1,41 @@
+import pytest
+
+from v2.content_journal import delete_op, put_op
+from v2.question_store import QuestionStore, build_bank
+
+
+def _put(topic, text, difficulty="Easy"):
+    return put_op(dict(topic=topic, question=text, options=["x", "y"],
+                       correct_answer="x", difficulty=difficulty))
+
+
+@pytest.fixture
+def bank(tmp_path):
+    db = str(tmp_path / "bank.db")
+    build_bank(db, [dict(topic="A", question=f"q{i}", options=["x", "y"], correct_answer="x",
+                         difficulty="Easy") for i in range(3)], "s0")
+    return db
+
+
+def test_other_store_sees_edits_after_refresh(bank):
+    editor, reader = QuestionStore(bank), QuestionStore(bank)
+    editor.apply([_put("B", "new", "Hard")], "s1")
+
+    assert len(editor) == 4 and editor.difficulties("B") == ("Hard",)
+    assert not editor.refresh()
+
+    assert reader.refresh()
+    assert len(reader) == 4 and reader.topics == ("A", "B")
+    assert reader.version == 1
+
+    reader.apply([delete_op("A", "q0")], "s2")
+    assert editor.refresh() and len(editor.ids("A")) == 2
+
+
+def test_failed_apply_leaves_caches_alone(bank):
+    store = QuestionStore(bank)
+    with pytest.raises(KeyError):
+        store.apply([_put("C", "z"), {"op": "put"}], "s1")
+
+    assert len(store) == 3 and store.topics == ("A",)
+    assert store.version == 0 and not store.refresh()
@@ -0,0 +1,44 @@
+import sqlite3
+
+import pytest
+
+from v2.migrations import migrate
+from v2.spaced_repetition import DAY, ReviewScheduler, review_quota
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    migrate(conn)
+    return conn
+
+
+def _answer(question_id, correct, response_time, ts=1000):
+    return (1, "T", 100 if correct else 0, response_time, "", ts, question_id, "Easy", None)
+
+
+def _cards(conn):
+    return dict(conn.execute("SELECT question_id, due_at FROM review_cards").fetchall())
+
+
+def test_only_misses_and_slow_answers_open_cards(conn):
+    ReviewScheduler().apply_answers(conn, [
+        _answer(1, True, 5),        # confident
+        _answer(2, True, 30),       # correct, unhurried
+        _answer(3, True, 90),       # slow
+        _answer(4, False, 5),       # miss
+    ])
+    assert sorted(_cards(conn)) == [3, 4]
+
+
+def test_confident_answer_reschedules_existing_card(conn):
+    scheduler = ReviewScheduler()
+    scheduler.apply_answers(conn, [_answer(1, False, 5)])
+    scheduler.apply_answers(conn, [_answer(1, True, 5, ts=2000)])
+    assert _cards(conn) == {1: 2000 + DAY}
+
+
+def test_review_quota_is_at_most_half():
+    assert review_quota(10) == 5
+    assert review_quota(5) == 2
+    assert review_quota(1) == 0
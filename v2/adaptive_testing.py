@@ -0,0 +1,128 @@
+import numpy as np
+
+# -------------------------
+# CAT PARAMETERS
+# -------------------------
+# Ability grid (logit scale shared with the Elo ratings)
+THETA_GRID = np.linspace(-4.0, 4.0, 161)
+
+PRIOR_SD = 1.0
+MIN_PRIOR_SD = 0.7      # a rated learner's prior never gets tighter than this
+
+# Stopping rule. A Rasch answer adds at most 0.25 to the precision (less
+# off-target), so from the unit prior SE 0.7 takes about 5-6 items, while
+# 0.6 would need 8-10 and almost never end a test early. The tradeoff: the
+# placement is good to about one difficulty band, which is all the label
+# (Easy/Medium/Hard) it feeds needs.
+SE_THRESHOLD = 0.7      # stop once the ability estimate is this precise
+MIN_ITEMS = 3
+MAX_ITEMS = 8           # shorter than the fixed-length quiz
+
+# Questions need this many answers before their Elo difficulty replaces the label prior
+MIN_CALIBRATION = 20
+
+
+def prior_for(ability):
+    """
+    (mean, sd) of the starting ability belief from an Elo `(rating, n)`
+    lookup, or the population prior for an unrated learner. Each Rasch
+    answer adds at most 0.25 to the precision, which sets how fast sd shrinks.
+    """
+    if not ability or not ability[1]:
+        return 0.0, PRIOR_SD
+    rating, n = ability
+    return rating, max(MIN_PRIOR_SD, (1.0 + 0.25 * n) ** -0.5)
+
+
+class ItemInformationTable:
+    """
+    Precomputed Rasch tables for one item pool.
+
+    `log_p` / `log_q` hold log P(correct) / log P(wrong) of every item at
+    every grid ability, and `order[g]` lists the items from most to least
+    informative at grid point g (Fisher information p * (1 - p)). Picking
+    the next item is then a walk down one precomputed row.
+    """
+
+    def __init__(self, question_ids, difficulties):
+        self.ids = np.asarray(question_ids, dtype=np.int64)
+        self.position = {qid: i for i, qid in enumerate(self.ids.tolist())}
+
+        b = np.asarray(difficulties, dtype=float)
+        p = 1.0 / (1.0 + np.exp(-(THETA_GRID[:, None] - b[None, :])))
+        self.log_p = np.log(p)
+        self.log_q = np.log1p(-p)
+        self.order = np.argsort(-(p * (1 - p)), axis=1, kind="stable")
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class CATSession:
+    """
+    One computerized adaptive test: a posterior over THETA_GRID updated
+    per answer (EAP), the items already given, and the stopping rule.
+    Small enough to keep in the session between reruns.
+    """
+
+    def __init__(self, table, prior_mean=0.0, prior_sd=PRIOR_SD,
+                 se_threshold=SE_THRESHOLD, min_items=MIN_ITEMS, max_items=MAX_ITEMS):
+        self.table = table
+        self.log_post = -0.5 * ((THETA_GRID - prior_mean) / prior_sd) ** 2
+        self.administered = []
+        self.responses = []
+        self.skipped = []
+        self.se_threshold = se_threshold
+        self.min_items = min_items
+        self.max_items = min(max_items, len(table))
+
+    # -------------------------
+    # ESTIMATE
+    # -------------------------
+    def _posterior(self):
+        w = np.exp(self.log_post - self.log_post.max())
+        return w / w.sum()
+
+    @property
+    def theta(self):
+        return float(self._posterior() @ THETA_GRID)
+
+    @property
+    def standard_error(self):
+        w = self._posterior()
+        mean = w @ THETA_GRID
+        return float(np.sqrt(w @ (THETA_GRID - mean) ** 2))
+
+    @property
+    def done(self):
+        n = len(self.administered)
+        if n >= self.max_items:
+            return True
+        return n >= self.min_items and self.standard_error < self.se_threshold
+
+    # -------------------------
+    # ITEM SELECTION
+    # -------------------------
+    def next_item(self):
+        """Id of the most informative unused item at the current estimate, or None."""
+        if self.done:
+            return None
+
+        g = int(np.abs(THETA_GRID - self.theta).argmin())
+        used = {self.table.position[qid] for qid in self.administered + self.skipped}
+        for i in self.table.order[g]:
+            if i not in used:
+                return int(self.table.ids[i])
+        return None
+
+    def record(self, question_id, correct):
+        i = self.table.position.get(question_id)
+        if i is None:
+            return
+        self.log_post = self.log_post + (self.table.log_p[:, i] if correct else self.table.log_q[:, i])
+        self.administered.append(question_id)
+        self.responses.append(bool(correct))
+
+    def skip(self, question_id):
+        """Never offer this item again; the estimate is unchanged."""
+        self.skipped.append(question_id)
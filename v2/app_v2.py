@@ -1,6 +1,6 @@
 import sys
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -20,13 +20,19 @@ if ROOT_DIR not in sys.path:
 from v2 import progress_tracker_v2
 from v2.learner_profiler_v2 import LearnerProfiler
 from v2.progress_tracker_v2 import ProgressTracker
+from v2.learner_snapshot import LearnerSnapshot
 
 from content_manager import ContentManager
 from adaptive_engine import AdaptiveEngine
 
-from v2.question_generator import QuestionGenerator
+from v2.question_generator import get_question_generator
+from v2.quiz_sampler import QuizSampler
+from v2.spaced_repetition import review_quota
 from v2.resource_recommender import ResourceRecommender
 
+# Questions in a fixed-length (non-CAT) quiz
+QUIZ_LENGTH = 10
+
 # -------------------------------
 # DATABASE + AUTH
 # -------------------------------
@@ -257,10 +263,10 @@ if st.session_state.get("large_text", False):
 # -------------------------------
 if "v2_init" not in st.session_state:
     st.session_state.v2_init = True
-    st.session_state.progress_tracker = ProgressTracker()
+    st.session_state.progress_tracker = ProgressTracker(write_behind=True)
     st.session_state.learner_profiler = LearnerProfiler()
     st.session_state.content_manager = ContentManager()
-    st.session_state.adaptive_engine = AdaptiveEngine()
+    st.session_state.adaptive_engine = AdaptiveEngine(st.session_state.progress_tracker)
 
     st.session_state.current_topic = None
     st.session_state.quiz_active = False
@@ -269,7 +275,6 @@ if "v2_init" not in st.session_state:
     st.session_state.quiz_answers = []
 
 student_id = st.session_state.user_id
-legacy_student_id = f"student_{student_id}"  # For backward compatibility
 
 # -------------------------------
 # SESSION STATE SAFETY INIT
@@ -336,15 +341,15 @@ if "quiz_answers" not in st.session_state:
 # APP OBJECTS
 # =============================
 
+if "progress_tracker" not in st.session_state:
+    st.session_state.progress_tracker = ProgressTracker(write_behind=True)
+
 if "adaptive_engine" not in st.session_state:
-    st.session_state.adaptive_engine = AdaptiveEngine()
+    st.session_state.adaptive_engine = AdaptiveEngine(st.session_state.progress_tracker)
 
 if "content_manager" not in st.session_state:
     st.session_state.content_manager = ContentManager()
 
-if "progress_tracker" not in st.session_state:
-    st.session_state.progress_tracker = ProgressTracker()
-
 if "learner_profiler" not in st.session_state:
     st.session_state.learner_profiler = LearnerProfiler()
 
@@ -352,7 +357,7 @@ if "quiz_topic" not in st.session_state:
     st.session_state.quiz_topic = None
 
 if "question_generator" not in st.session_state:
-    st.session_state.question_generator = QuestionGenerator()
+    st.session_state.question_generator = get_question_generator()
 
 if "resource_recommender" not in st.session_state:
     st.session_state.resource_recommender = ResourceRecommender()
@@ -381,12 +386,19 @@ if "total_attempts" not in st.session_state:
 if "show_hints" not in st.session_state:
     st.session_state.show_hints = True      # default ON
 
-if "asked_questions" not in st.session_state:
-    st.session_state.asked_questions = set()
+if "quiz_sampler" not in st.session_state:
+    st.session_state.quiz_sampler = QuizSampler()    # no repeats within a quiz
+
+if "cat_mode" not in st.session_state:
+    st.session_state.cat_mode = False       # default OFF
+
+if "cat" not in st.session_state:
+    st.session_state.cat = None
 
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 import io
+import csv
 
 def generate_certificate(name, topic, score):
     buffer = io.BytesIO()
@@ -422,6 +434,21 @@ def generate_certificate(name, topic, score):
     return buffer
 
 
+def history_csv(tracker, student_id, start=None):
+    """Stream a learner's history into CSV bytes page by page."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["timestamp", "topic", "accuracy", "response_time"])
+
+    for page in tracker.iter_history_pages(student_id, start=start):
+        writer.writerows(
+            (datetime.fromtimestamp(ts).isoformat(), topic, accuracy, response_time)
+            for _, ts, topic, accuracy, response_time in page
+        )
+
+    return buffer.getvalue().encode("utf-8")
+
+
 # -------------------------------
 # SIDEBAR
 # -------------------------------
@@ -451,9 +478,16 @@ with st.sidebar:
     # -----------------------------
     # QUICK STATS
     # -----------------------------
-    progress = st.session_state.progress_tracker.get_student_progress(
-        st.session_state.current_student_id
+    # One snapshot per rerun, shared with the dashboard and recommendations;
+    # re-read from the DB only when this learner's progress version changes
+    snapshot = LearnerSnapshot.load(
+        student_id,
+        st.session_state.progress_tracker,
+        st.session_state.learner_profiler,
+        st.session_state.get("learner_snapshot")
     )
+    st.session_state.learner_snapshot = snapshot
+    progress = snapshot.progress
 
     st.markdown(f"""
     <div class="sidebar-card">
@@ -537,10 +571,10 @@ if st.session_state.get("show_logout_confirm"):
 # ======================================================
 if page == "🏠 Dashboard":
 
-    progress = st.session_state.progress_tracker.get_student_progress(student_id)
-    profile = st.session_state.learner_profiler.get_profile(student_id)
+    progress = snapshot.progress
+    profile = snapshot.profile
 
-    overall = st.session_state.progress_tracker.compute_overall_score(student_id)
+    overall = snapshot.overall_score
     accuracy = progress["average_accuracy"]
     topics = progress["topics_completed"]
     pace = profile["pace"]
@@ -602,9 +636,7 @@ if page == "🏠 Dashboard":
     # -------- LEFT SIDE: RECENT ACTIVITY --------
     with left_col:
         st.markdown("### 🕒 Recent Activity")
-        recent = st.session_state.progress_tracker.get_recent_activity(
-            student_id, limit=5
-        )
+        recent = snapshot.recent_activity
 
         if recent:
             for r in recent:
@@ -632,7 +664,7 @@ if page == "🏠 Dashboard":
         st.markdown("### 🎯 Personalized Recommendations")
 
         recs = st.session_state.adaptive_engine.get_recommendations(
-            legacy_student_id
+            student_id, snapshot=snapshot
         )
 
         if not recs:
@@ -717,11 +749,24 @@ elif page == "📚 Start Learning":
 
                 st.session_state.quiz_questions = (
                     st.session_state.content_manager.generate_quiz(
-                        topic, student_id, difficulty=difficulty
+                        topic, student_id, difficulty=difficulty,
+                        review_ids=st.session_state.progress_tracker.get_due_reviews(
+                            student_id, topic
+                        )
                     )
                 )
 
                 st.caption(f"🎯 Difficulty: {difficulty}")
+                st.session_state.difficulty = difficulty
+
+                # 📐 CAT: adaptive placement test seeded with the learner's rating
+                st.session_state.cat = (
+                    st.session_state.question_generator.start_cat(
+                        topic,
+                        st.session_state.progress_tracker.get_topic_ability(student_id, topic)
+                    )
+                    if st.session_state.cat_mode else None
+                )
 
                 st.session_state.quiz_active = True
                 st.session_state.quiz_topic = topic
@@ -729,7 +774,10 @@ elif page == "📚 Start Learning":
                 st.session_state.quiz_answers = []
                 st.session_state.question_start_time = datetime.now()
                 st.session_state.learning_stage = "quiz"
-                st.session_state.asked_questions = set()
+                st.session_state.quiz_sampler = QuizSampler()
+                st.session_state.miss_streak = 0
+                st.session_state.reviews_asked = 0
+                st.session_state.pop("last_feedback", None)
                 st.rerun()
 
 
@@ -755,16 +803,43 @@ elif page == "📚 Start Learning":
         # ---------------------------------
         if "current_question" not in st.session_state:
 
-            if st.session_state.get("ai_questions", False):
-                q = st.session_state.question_generator.generate_ai_question(
-                    st.session_state.current_topic,
-                    st.session_state.difficulty
+            if st.session_state.cat is not None:
+                # 📐 CAT: most informative item at the current ability estimate
+                q = st.session_state.question_generator.generate_cat_question(
+                    st.session_state.cat
                 )
+                if q is None:
+                    st.session_state.learning_stage = "result"
+                    st.rerun()
+                st.session_state.difficulty = q["difficulty"]
+
             else:
-                q = st.session_state.question_generator.generate_question(
-                    st.session_state.current_topic,
-                    st.session_state.difficulty
-                )
+                # 🔁 DUE REVIEWS FIRST (spaced repetition), up to half the quiz
+                sampler = st.session_state.quiz_sampler
+                q = None
+                if st.session_state.get("reviews_asked", 0) < review_quota(QUIZ_LENGTH):
+                    due = st.session_state.progress_tracker.get_due_reviews(
+                        student_id, st.session_state.current_topic, limit=5
+                    )
+                    q = st.session_state.question_generator.generate_review_question(
+                        due, exclude=sampler.asked
+                    )
+                if q:
+                    sampler.mark(q["question_id"])
+                    st.session_state.reviews_asked = st.session_state.get("reviews_asked", 0) + 1
+
+                if not q and st.session_state.get("ai_questions", False):
+                    q = st.session_state.question_generator.generate_ai_question(
+                        st.session_state.current_topic,
+                        st.session_state.difficulty,
+                        sampler=sampler
+                    )
+                elif not q:
+                    q = st.session_state.question_generator.generate_question(
+                        st.session_state.current_topic,
+                        st.session_state.difficulty,
+                        sampler=sampler
+                    )
 
             # 🔐 HARD VALIDATION
             if (
@@ -797,6 +872,21 @@ elif page == "📚 Start Learning":
             del st.session_state.current_question
             st.rerun()
 
+        # ---------------------------------
+        # FEEDBACK ON THE PREVIOUS ANSWER
+        # ---------------------------------
+        last = st.session_state.pop("last_feedback", None)
+        if last is not None:
+            was_correct, feedback, correct_answer, show_hint = last
+            if was_correct:
+                st.success("✅ Correct!")
+            else:
+                st.error(f"❌ Correct answer: {correct_answer}")
+            if st.session_state.get("show_feedback", True):
+                st.caption(feedback)
+            if show_hint and st.session_state.get("show_hints", True):
+                st.info("💡 Hint: rule out the options you're sure are wrong, then compare what's left.")
+
         # ---------------------------------
         # UI
         # ---------------------------------
@@ -825,6 +915,8 @@ elif page == "📚 Start Learning":
         # ⏭ SKIP LOGIC
         # ---------------------------------
         if skip:
+            if st.session_state.cat is not None:
+                st.session_state.cat.skip(q["question_id"])
             st.session_state.question_count += 1
             del st.session_state.current_question
             st.session_state.question_start_time = datetime.now()
@@ -840,40 +932,52 @@ elif page == "📚 Start Learning":
                 datetime.now() - st.session_state.question_start_time
             ).total_seconds()
 
-            # SAVE RESULT
-            st.session_state.progress_tracker.record_quiz_response(
+            # SAVE RESULT: one transaction that also returns the feedback,
+            # the next difficulty and a fresh snapshot for the next rerun
+            misses = 0 if correct else st.session_state.get("miss_streak", 0) + 1
+            result = st.session_state.adaptive_engine.submit_answer(
                 student_id,
                 st.session_state.current_topic,
                 correct,
-                response_time
+                response_time,
+                question_id=q.get("question_id"),
+                difficulty=q.get("difficulty", st.session_state.difficulty),
+                subtopic=q.get("subtopic"),
+                question_attempts=misses
             )
+            st.session_state.miss_streak = misses
+            st.session_state.learner_snapshot = result["snapshot"]
+            st.session_state.last_feedback = (
+                correct, result["feedback"], q["correct_answer"], result["show_hint"]
+            )
+            if q.get("question_id") is not None:
+                st.session_state.question_generator.record_answer(
+                    q["question_id"], correct
+                )
+
+            if st.session_state.cat is not None:
+                st.session_state.cat.record(q["question_id"], correct)
 
             st.session_state.total_attempts += 1
             st.session_state.question_count += 1
 
             if correct:
                 st.session_state.score += 1
-                st.success("✅ Correct!")
-            else:
-                st.error(f"❌ Correct answer: {q['correct_answer']}")
-
-            # AUTO DIFFICULTY
-            accuracy = (
-                st.session_state.score /
-                max(1, st.session_state.question_count)
-            ) * 100
-
-            if accuracy >= 80:
-                st.session_state.difficulty = "Hard"
-            elif accuracy >= 50:
-                st.session_state.difficulty = "Medium"
-            else:
-                st.session_state.difficulty = "Easy"
+
+            # AUTO DIFFICULTY (fixed-length quiz; CAT picks its own items)
+            if st.session_state.cat is None:
+                st.session_state.difficulty = result["next_difficulty"]
 
             del st.session_state.current_question
             st.session_state.question_start_time = datetime.now()
 
-            if st.session_state.question_count >= 10:
+            # CAT stops as soon as the ability estimate is precise enough
+            if st.session_state.cat is not None:
+                quiz_over = st.session_state.cat.done
+            else:
+                quiz_over = st.session_state.question_count >= QUIZ_LENGTH
+
+            if quiz_over:
                 st.session_state.learning_stage = "result"
 
             st.rerun()
@@ -952,11 +1056,22 @@ elif page == "📚 Start Learning":
         st.markdown("### 📊 Topic Mastery")
         st.plotly_chart(fig, use_container_width=True)
 
+        # ----------------------------------
+        # 📐 CAT PLACEMENT
+        # ----------------------------------
+        cat = st.session_state.cat
+        if cat is not None and cat.administered:
+            placement = st.session_state.adaptive_engine.ratings.difficulty_for(cat.theta)
+            st.info(
+                f"📐 Placement: **{placement}** after {len(cat.administered)} "
+                f"questions (ability {cat.theta:+.2f} ± {cat.standard_error:.2f})"
+            )
+
         # ----------------------------------
         # 🚀 ADAPTIVE NEXT STEPS
         # ----------------------------------
         next_steps = st.session_state.adaptive_engine.get_next_steps(
-            legacy_student_id,
+            student_id,
             st.session_state.current_topic,
             accuracy
         )
@@ -1009,6 +1124,7 @@ elif page == "📚 Start Learning":
                 st.session_state.question_count = 0
                 st.session_state.score = 0
                 st.session_state.difficulty = "Easy"
+                st.session_state.cat = None
                 st.rerun()
 
         with col2:
@@ -1016,8 +1132,20 @@ elif page == "📚 Start Learning":
                 st.session_state.learning_stage = "quiz"
                 st.session_state.question_count = 0
                 st.session_state.score = 0
-                st.session_state.difficulty = "Easy"
-                st.session_state.asked_questions.clear()
+                st.session_state.difficulty = st.session_state.adaptive_engine.adapt_difficulty(
+                    student_id, st.session_state.current_topic
+                )
+                st.session_state.quiz_sampler = QuizSampler()
+                st.session_state.miss_streak = 0
+                st.session_state.reviews_asked = 0
+                st.session_state.pop("last_feedback", None)
+                if st.session_state.cat is not None:
+                    st.session_state.cat = st.session_state.question_generator.start_cat(
+                        st.session_state.current_topic,
+                        st.session_state.progress_tracker.get_topic_ability(
+                            student_id, st.session_state.current_topic
+                        )
+                    )
                 st.rerun()
 
 
@@ -1027,15 +1155,33 @@ elif page == "📚 Start Learning":
 elif page == "📊 Progress Analytics":
     st.markdown("## 📊 Learning Analytics Dashboard")
 
-    history = st.session_state.progress_tracker.get_learning_history(student_id)
+    window_days = {
+        "Last 7 days": 7,
+        "Last 30 days": 30,
+        "Last 90 days": 90,
+        "All time": None,
+    }
+    window = st.selectbox("Time window", list(window_days), index=1)
+
+    days = window_days[window]
+    window_start = None if days is None else datetime.now() - timedelta(days=days)
+
+    # Only the selected window is fetched, streamed as compact record arrays
+    pages = list(st.session_state.progress_tracker.iter_history_pages(
+        student_id, start=window_start, as_numpy=True
+    ))
 
-    if not history:
-        st.info("No learning data yet. Start learning to see analytics!")
+    if not pages:
+        st.info("No learning data in this window. Start learning to see analytics!")
         st.stop()
 
-    df = pd.DataFrame(history)
-    df["date"] = pd.to_datetime(df["date"])
-    df["day"] = df["date"].dt.date
+    df = pd.DataFrame(np.concatenate(pages))
+
+    # Per-day counts come bucketed from SQL, in the browser's time zone
+    daily = pd.DataFrame(st.session_state.progress_tracker.get_daily_activity(
+        student_id, start=window_start, tz=getattr(st.context, "timezone", None)
+    ))
+    daily["day"] = pd.to_datetime(daily["day"])
 
     # -------------------------------
     # KPI METRICS
@@ -1071,15 +1217,13 @@ elif page == "📊 Progress Analytics":
     # -------------------------------
     st.markdown("### 📈 Accuracy Over Time")
 
-    acc_time = df.groupby("date")["accuracy"].mean().reset_index()
-
     fig1 = px.line(
-        acc_time,
-        x="date",
+        daily,
+        x="day",
         y="accuracy",
         markers=True,
         title="Accuracy Trend",
-        labels={"accuracy": "Accuracy (%)", "date": "Time"},
+        labels={"accuracy": "Accuracy (%)", "day": "Date"},
         template="plotly_white"
     )
 
@@ -1109,13 +1253,11 @@ elif page == "📊 Progress Analytics":
     # -------------------------------
     st.markdown("### 📅 Learning Activity Frequency")
 
-    activity = df.groupby("day").size().reset_index(name="Attempts")
-
     fig3 = px.bar(
-        activity,
+        daily,
         x="day",
-        y="Attempts",
-        labels={"day": "Date"},
+        y="attempts",
+        labels={"day": "Date", "attempts": "Attempts"},
         template="plotly_white"
     )
 
@@ -1130,7 +1272,7 @@ elif page == "📊 Progress Analytics":
 
     insight_text = f"""
     ✅ **Strongest Topic:** {best_topic['topic']} ({best_topic['accuracy']:.1f}% accuracy)  
-    📈 **Overall Trend:** {'Improving' if acc_time['accuracy'].iloc[-1] >= acc_time['accuracy'].iloc[0] else 'Needs Attention'}  
+    📈 **Overall Trend:** {'Improving' if daily['accuracy'].iloc[-1] >= daily['accuracy'].iloc[0] else 'Needs Attention'}  
     💡 **Suggestion:** Practice weaker topics to balance performance.
     """
 
@@ -1208,8 +1350,7 @@ elif page == "📊 Progress Analytics":
     # -------------------------------
     st.markdown("### 🔥 Weekly Learning Streak")
 
-    df["day"] = df["date"].dt.date
-    unique_days = sorted(df["day"].unique())
+    unique_days = list(daily["day"])
 
     streak = 1
     max_streak = 1
@@ -1231,11 +1372,13 @@ elif page == "📊 Progress Analytics":
     # -------------------------------
     st.markdown("### 📥 Download Your Analytics")
 
-    csv = df.to_csv(index=False).encode("utf-8")
+    csv_data = history_csv(
+        st.session_state.progress_tracker, student_id, start=window_start
+    )
 
     st.download_button(
         label="📄 Download Analytics (CSV)",
-        data=csv,
+        data=csv_data,
         file_name="learning_analytics.csv",
         mime="text/csv"
     )
@@ -1548,6 +1691,11 @@ elif page == "⚙️ Settings":
         "💡 Turning OFF shuffle will prevent option re-ordering during quiz attempts."
     )
 
+    cat_mode = st.toggle(
+        "Adaptive placement test (ends early once your level is clear)",
+        value=st.session_state.cat_mode
+    )
+
     st.markdown("---")
 
     # --------------------------------------------------
@@ -1607,6 +1755,7 @@ elif page == "⚙️ Settings":
         st.session_state.show_hints = show_hints
         st.session_state.shuffle_options = shuffle_options
         st.session_state.ai_questions = ai_questions
+        st.session_state.cat_mode = cat_mode
 
         st.session_state.learner_profiler.update_preferences(
             student_id,
@@ -1618,6 +1767,7 @@ elif page == "⚙️ Settings":
                 "show_hints": show_hints,
                 "shuffle_options": shuffle_options,
                 "ai_questions": ai_questions,
+                "cat_mode": cat_mode,
             }
         )
 
@@ -1,5 +1,5 @@
 import bcrypt
-from v2.database import get_connection
+from v2.database import connection, transaction
 from datetime import datetime
 
 
@@ -26,31 +26,29 @@ def create_user(email: str, password: str) -> bool:
     Create a new user with hashed password.
     Returns False if user already exists.
     """
-    conn = get_connection()
-    cur = conn.cursor()
+    # Hash outside the transaction so bcrypt doesn't hold the write lock
+    hashed = hash_password(password)
 
-    # Check if user exists
-    cur.execute("SELECT id FROM users WHERE username = ?", (email,))
-    if cur.fetchone():
-        conn.close()
-        return False
+    with transaction() as conn:
+        cur = conn.cursor()
 
-    hashed = hash_password(password)
+        # Check if user exists
+        cur.execute("SELECT id FROM users WHERE username = ?", (email,))
+        if cur.fetchone():
+            return False
 
-    cur.execute("""
-        INSERT INTO users (username, created_at)
-        VALUES (?, ?)
-    """, (email, datetime.now().isoformat()))
+        cur.execute("""
+            INSERT INTO users (username, created_at)
+            VALUES (?, ?)
+        """, (email, datetime.now().isoformat()))
 
-    user_id = cur.lastrowid
+        user_id = cur.lastrowid
 
-    cur.execute("""
-        INSERT INTO auth (user_id, password_hash)
-        VALUES (?, ?)
-    """, (user_id, hashed))
+        cur.execute("""
+            INSERT INTO auth (user_id, password_hash)
+            VALUES (?, ?)
+        """, (user_id, hashed))
 
-    conn.commit()
-    conn.close()
     return True
 
 
@@ -58,18 +56,17 @@ def authenticate_user(email: str, password: str) -> bool:
     """
     Authenticate user by checking hashed password.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT u.id, a.password_hash
-        FROM users u
-        JOIN auth a ON u.id = a.user_id
-        WHERE u.username = ?
-    """, (email,))
-
-    row = cur.fetchone()
-    conn.close()
+    with connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT u.id, a.password_hash
+            FROM users u
+            JOIN auth a ON u.id = a.user_id
+            WHERE u.username = ?
+        """, (email,))
+
+        row = cur.fetchone()
 
     if not row:
         return None
@@ -0,0 +1,136 @@
+import numpy as np
+
+from v2.database import chunked, connection, placeholders
+
+# -------------------------
+# DEFAULTS
+# -------------------------
+# Items are most useful when the learner gets them right about this often
+TARGET_SUCCESS = 0.7
+
+# Beta(1, 1) prior on every item's success rate
+PRIOR_ALPHA = 1.0
+PRIOR_BETA = 1.0
+
+class ThompsonSelector:
+    """
+    Thompson-sampling question selector.
+
+    Beta posteriors over each item's P(correct) live in flat NumPy arrays;
+    a pool (e.g. one topic/difficulty) is a contiguous slice of them. A draw
+    samples every item of the pool in one vectorized call and picks the item
+    whose sample is closest to TARGET_SUCCESS, so items that are too easy or
+    too hard are tried less as evidence accumulates.
+    """
+
+    def __init__(self, target=TARGET_SUCCESS, seed=None):
+        self.target = target
+        self.rng = np.random.default_rng(seed)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.alpha = np.zeros(0)
+        self.beta = np.zeros(0)
+        self.pools = {}       # key -> slice into the arrays
+        self.index = {}       # question_id -> position in the arrays
+
+    def add_pool(self, key, question_ids):
+        ids = np.asarray(question_ids, dtype=np.int64)
+        start = len(self.ids)
+
+        self.ids = np.concatenate([self.ids, ids])
+        self.alpha = np.concatenate([self.alpha, np.full(len(ids), PRIOR_ALPHA)])
+        self.beta = np.concatenate([self.beta, np.full(len(ids), PRIOR_BETA)])
+
+        self.pools[key] = slice(start, start + len(ids))
+        for pos, qid in enumerate(ids.tolist(), start):
+            self.index[qid] = pos
+
+    # -------------------------
+    # SELECTION
+    # -------------------------
+    def select(self, key, exclude=()):
+        """
+        Position of the chosen item within pool `key`, or None if the pool
+        is empty. Items whose id is in `exclude` are skipped unless nothing
+        else is left.
+        """
+        pool = self.pools.get(key)
+        if pool is None or pool.start == pool.stop:
+            return None
+
+        score = -np.abs(self.rng.beta(self.alpha[pool], self.beta[pool]) - self.target)
+        if exclude:
+            seen = np.isin(self.ids[pool], np.fromiter(exclude, dtype=np.int64))
+            if not seen.all():
+                score[seen] = -np.inf
+        return int(np.argmax(score))
+
+    def choose(self, question_ids):
+        """
+        Index of the Thompson pick among a few candidate ids (e.g. a
+        QuizSampler window); unknown ids score as an unplayed item.
+        """
+        pos = np.array([self.index.get(qid, -1) for qid in question_ids], dtype=np.int64)
+        known = pos >= 0
+        alpha = np.full(len(pos), PRIOR_ALPHA)
+        beta = np.full(len(pos), PRIOR_BETA)
+        alpha[known] = self.alpha[pos[known]]
+        beta[known] = self.beta[pos[known]]
+
+        return int(np.argmax(-np.abs(self.rng.beta(alpha, beta) - self.target)))
+
+    # -------------------------
+    # UPDATES
+    # -------------------------
+    def update(self, question_id, correct):
+        """Fold one answer into its item's posterior. Unknown ids are ignored."""
+        pos = self.index.get(question_id)
+        if pos is None:
+            return
+        if correct:
+            self.alpha[pos] += 1
+        else:
+            self.beta[pos] += 1
+
+    def load_posteriors(self):
+        """Warm-start every item from the answer counts in item_difficulty."""
+        for chunk in chunked(self.index):
+            with connection() as conn:
+                rows = conn.execute(f"""
+                    SELECT question_id, n, correct FROM item_difficulty
+                    WHERE question_id IN ({placeholders(len(chunk))})
+                """, chunk).fetchall()
+
+            for qid, n, correct in rows:
+                pos = self.index[qid]
+                self.alpha[pos] = PRIOR_ALPHA + correct
+                self.beta[pos] = PRIOR_BETA + n - correct
+
+    # -------------------------
+    # OFFLINE EVALUATION
+    # -------------------------
+    def replay(self, events):
+        """
+        Replay logged `(pool_key, question_id, correct)` events in order
+        (rejection-sampling evaluation). An event counts only when the policy,
+        given the posteriors so far, would have picked the logged item; only
+        those events update the posteriors.
+
+        Returns {"events", "matched", "success_rate", "target_gap"}.
+        """
+        total = matched = matched_correct = 0
+        for key, question_id, correct in events:
+            total += 1
+            pos = self.select(key)
+            if pos is None or int(self.ids[self.pools[key]][pos]) != question_id:
+                continue
+            matched += 1
+            matched_correct += bool(correct)
+            self.update(question_id, correct)
+
+        success_rate = matched_correct / matched if matched else None
+        return {
+            "events": total,
+            "matched": matched,
+            "success_rate": success_rate,
+            "target_gap": abs(success_rate - self.target) if matched else None,
+        }
@@ -0,0 +1,149 @@
+from collections import deque
+
+import numpy as np
+
+SEPARATOR = "/"
+
+
+def node_id(topic, subtopic=None):
+    """Graph id of a topic ("Mathematics") or subtopic ("Mathematics/Algebra")."""
+    return topic if not subtopic else f"{topic}{SEPARATOR}{subtopic}"
+
+
+class ContentGraph:
+    """
+    Prerequisite DAG over topics and subtopics.
+
+    Everything that does not depend on the learner is computed once at
+    load: a topological order, each node's rank in it, the edge list as
+    NumPy arrays, and every node's ancestors as an int bitset. Per-learner
+    queries are then masks over a boolean "mastered" vector.
+    """
+
+    def __init__(self, ids, edges):
+        self.ids = list(ids)
+        self.index = {nid: i for i, nid in enumerate(self.ids)}
+        n = len(self.ids)
+
+        src = np.array([self.index[a] for a, _ in edges], dtype=np.int64)
+        dst = np.array([self.index[b] for _, b in edges], dtype=np.int64)
+        self.src, self.dst = src, dst
+        self.in_degree = np.bincount(dst, minlength=n)
+
+        # Kahn's algorithm; ties broken by catalog order
+        children = [[] for _ in range(n)]
+        for a, b in zip(src.tolist(), dst.tolist()):
+            children[a].append(b)
+
+        remaining = self.in_degree.copy()
+        ready = deque(i for i in range(n) if remaining[i] == 0)
+        order = []
+        while ready:
+            i = ready.popleft()
+            order.append(i)
+            for c in children[i]:
+                remaining[c] -= 1
+                if remaining[c] == 0:
+                    ready.append(c)
+        if len(order) != n:
+            cyclic = [self.ids[i] for i in range(n) if remaining[i] > 0]
+            raise ValueError(f"prerequisite cycle among: {', '.join(cyclic)}")
+
+        self.order = np.array(order, dtype=np.int64)
+        self.rank = np.empty(n, dtype=np.int64)
+        self.rank[self.order] = np.arange(n)
+
+        # ancestors[i]: bit j set iff j must be learned before i
+        parents = [[] for _ in range(n)]
+        for a, b in zip(src.tolist(), dst.tolist()):
+            parents[b].append(a)
+        self.ancestors = [0] * n
+        for i in order:
+            bits = 0
+            for p in parents[i]:
+                bits |= self.ancestors[p] | (1 << p)
+            self.ancestors[i] = bits
+
+        # Topics unlocked next by each topic (cross-topic edges), in topological order
+        self.topic_of = [nid.split(SEPARATOR, 1)[0] for nid in self.ids]
+        next_topics = {}
+        for a, b in zip(src.tolist(), dst.tolist()):
+            ta, tb = self.topic_of[a], self.topic_of[b]
+            if ta != tb:
+                next_topics.setdefault(ta, set()).add(tb)
+        self.next_topics = {
+            t: sorted(ts, key=lambda x: self.rank[self.index[x]])
+            for t, ts in next_topics.items()
+        }
+        self.topic_order = [self.ids[i] for i in order if SEPARATOR not in self.ids[i]]
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """
+        Build from the content catalog: {topic: {"requires": [...],
+        "subtopics": {name: [prerequisites]}}}. Prerequisites name siblings
+        or, with a "/", any node. A topic depends on all of its subtopics;
+        its own "requires" gate the subtopics that have no sibling
+        prerequisite.
+        """
+        ids, edges = [], []
+        for topic, spec in catalog.items():
+            subtopics = spec.get("subtopics", {})
+            ids.extend(node_id(topic, s) for s in subtopics)
+            ids.append(topic)
+
+        for topic, spec in catalog.items():
+            subtopics = spec.get("subtopics", {})
+            requires = spec.get("requires", [])
+
+            for name, prereqs in subtopics.items():
+                sub = node_id(topic, name)
+                edges.append((sub, topic))
+                for p in prereqs:
+                    edges.append((p if SEPARATOR in p else node_id(topic, p), sub))
+                if not prereqs:
+                    edges.extend((r, sub) for r in requires)
+
+            if not subtopics:
+                edges.extend((r, topic) for r in requires)
+
+        return cls(ids, edges)
+
+    # -------------------------
+    # PER-LEARNER QUERIES
+    # -------------------------
+    def mastered_mask(self, mastered_ids):
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[[self.index[m] for m in mastered_ids if m in self.index]] = True
+        return mask
+
+    def unmet(self, mastered):
+        """Number of not-yet-mastered direct prerequisites of every node."""
+        return np.bincount(self.dst, weights=~mastered[self.src], minlength=len(self.ids))
+
+    def frontier(self, mastered):
+        """Unmastered nodes whose prerequisites are all mastered, in topological order."""
+        ready = ~mastered & (self.unmet(mastered) == 0)
+        return [self.ids[i] for i in self.order[ready[self.order]]]
+
+    def learning_path(self, mastered, target=None, limit=None):
+        """
+        Unmastered nodes in topological order, as (id, ready) pairs. With a
+        `target`, only the target and its unmastered ancestors.
+        """
+        todo = ~mastered
+        if target is not None:
+            t = self.index[target]
+            bits = self.ancestors[t] | (1 << t)
+            nbytes = (len(self.ids) + 7) // 8
+            wanted = np.unpackbits(
+                np.frombuffer(bits.to_bytes(nbytes, "little"), dtype=np.uint8),
+                bitorder="little"
+            )[:len(self.ids)].astype(bool)
+            todo &= wanted
+
+        path = self.order[todo[self.order]]
+        if limit is not None:
+            path = path[:limit]
+        ready = self.unmet(mastered)[path] == 0
+        return [(self.ids[i], bool(r)) for i, r in zip(path, ready)]
@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:     # not POSIX: only the in-process lock applies
+    fcntl = None
+
+# Journal entries that trigger folding the journal into the snapshot
+COMPACT_EVERY = 5000
+
+
+def journal_path(snapshot_file):
+    """content_data.json -> content_data.journal"""
+    return os.path.splitext(snapshot_file)[0] + ".journal"
+
+
+def nested_records(questions):
+    """Flatten {topic: {subtopic: [question dicts]}} into question records."""
+    return [
+        dict(q, topic=topic, subtopic=subtopic)
+        for topic, subtopics in questions.items()
+        for subtopic, q_list in subtopics.items()
+        for q in q_list
+    ]
+
+
+def put_op(record):
+    """Journal entry adding or replacing a question (keyed by topic + question text)."""
+    for field in ("topic", "question", "options", "correct_answer"):
+        if field not in record:
+            raise ValueError(f"question record is missing {field!r}")
+    if record["correct_answer"] not in record["options"]:
+        raise ValueError(f"correct answer not among the options: {record['question']!r}")
+
+    return {
+        "op": "put",
+        "topic": record["topic"],
+        "subtopic": record.get("subtopic") or "",
+        "difficulty": record.get("difficulty") or "Medium",
+        "question": record["question"],
+        "options": list(record["options"]),
+        "correct_answer": record["correct_answer"],
+        "explanation": record.get("explanation", ""),
+    }
+
+
+def delete_op(topic, question):
+    return {"op": "delete", "topic": topic, "question": question}
+
+
+class ContentJournal:
+    """
+    Custom question content as a snapshot plus an append-only edit journal.
+
+    Every edit appends one JSON line (fsynced) to the journal, so saving is
+    O(edit) however large the content is. compact() folds the journal into
+    a new snapshot written to a temp file and renamed over the old one, then
+    drops the journal bytes it folded in; replay is idempotent, so a crash
+    between the two steps loses nothing. The snapshot keeps the
+    content_data.json layout, plus the (topic, question) keys of deleted
+    base-bank questions.
+
+    Appends and compaction hold an exclusive lock on the journal file,
+    replay a shared one, so sessions and processes editing the same content
+    never lose each other's edits. Use get_content_journal() for the
+    process-wide instance of a file.
+    """
+
+    def __init__(self, snapshot_file, compact_every=COMPACT_EVERY):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_path(snapshot_file)
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self.entries = len(self._read_journal()[0])
+
+    @contextmanager
+    def _locked(self, exclusive):
+        """Journal file opened (binary) for appending, under the in-process and file locks."""
+        with self._lock, open(self.journal_file, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield f
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # -------------------------
+    # READ / REPLAY
+    # -------------------------
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_file):
+            return {}
+        try:
+            with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _read_journal(self):
+        """(entries, byte offset just past the last complete line)."""
+        if not os.path.exists(self.journal_file):
+            return [], 0
+        ops, offset = [], 0
+        with open(self.journal_file, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    ops.append(json.loads(line))
+                except ValueError:
+                    continue    # torn line from an interrupted append
+        return ops, offset
+
+    def load(self):
+        """
+        Replay snapshot + journal. Returns (records, deleted): the custom
+        questions in edit order and the set of deleted (topic, question) keys.
+        """
+        if not os.path.exists(self.journal_file):
+            return self._replay()[:2]
+        with self._locked(exclusive=False):
+            return self._replay()[:2]
+
+    def _replay(self):
+        """load() without locking; also returns the journal offset replayed up to."""
+        snapshot = self._read_snapshot()
+        records = {
+            (r["topic"], r["question"]): r
+            for r in nested_records(snapshot.get("questions", {}))
+        }
+        deleted = {tuple(key) for key in snapshot.get("deleted", [])}
+
+        ops, offset = self._read_journal()
+        for op in ops:
+            key = (op["topic"], op["question"])
+            records.pop(key, None)
+            if op["op"] == "put":
+                records[key] = {k: v for k, v in op.items() if k != "op"}
+                deleted.discard(key)
+            else:
+                deleted.add(key)
+
+        return list(records.values()), deleted, offset
+
+    # -------------------------
+    # WRITE
+    # -------------------------
+    def append(self, ops):
+        """Durably append edit entries (put_op / delete_op) in one write."""
+        lines = "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops).encode()
+        with self._locked(exclusive=True) as f:
+            # Start on a fresh line if an interrupted append left a partial one
+            if f.seek(0, os.SEEK_END) and os.pread(f.fileno(), 1, f.tell() - 1) != b"\n":
+                lines = b"\n" + lines
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+            self.entries += len(ops)
+
+    def needs_compaction(self):
+        return self.entries >= self.compact_every
+
+    def compact(self):
+        """
+        Fold the journal into a fresh snapshot (temp file + atomic rename),
+        then remove the folded-in entries from the journal, keeping any bytes
+        past them.
+        """
+        with self._locked(exclusive=True):
+            records, deleted, offset = self._replay()
+
+            questions = {}
+            for r in records:
+                questions.setdefault(r["topic"], {}).setdefault(r.get("subtopic", ""), []).append({
+                    k: v for k, v in r.items() if k not in ("topic", "subtopic")
+                })
+
+            tmp = self.snapshot_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"questions": questions, "deleted": sorted(deleted)},
+                    f, ensure_ascii=False, indent=2
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_file)
+
+            with open(self.journal_file, "r+b") as f:
+                f.seek(offset)
+                rest = f.read()
+                f.seek(0)
+                f.write(rest)
+                f.truncate(len(rest))
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries = rest.count(b"\n")
+
+
+# -----------------------------
+# SHARED JOURNALS
+# -----------------------------
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_content_journal(snapshot_file):
+    """Process-wide ContentJournal for a snapshot file (one lock and counter per file)."""
+    journal = _journals.get(snapshot_file)
+    if journal is None:
+        with _journals_lock:
+            journal = _journals.setdefault(snapshot_file, ContentJournal(snapshot_file))
+    return journal
@@ -1,80 +1,203 @@
+import atexit
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
+from v2.migrations import migrate
+
 DB_NAME = "learning_v2.db"
 
+# -------------------------
+# CONNECTION TUNING
+# -------------------------
+POOL_SIZE = 8                   # max open connections per database file
+POOL_TIMEOUT = 10.0             # seconds to wait for a free connection
+BUSY_TIMEOUT_MS = 5000          # wait on SQLite's write lock instead of failing
+CACHE_SIZE_KB = 16384           # page cache per connection (16 MB)
+MMAP_SIZE = 256 * 1024 * 1024   # memory-mapped I/O window (256 MB)
+MAX_PARAMS = 900                # stay under SQLite's legacy 999 host-parameter cap
 
-def get_connection():
-    """
-    Returns a SQLite connection.
-    check_same_thread=False is required for Streamlit.
-    """
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
 
+def _configure(conn):
+    """Apply per-connection pragmas (runs once, when the connection opens)."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
 
-def init_db():
+
+class ConnectionPool:
     """
-    Creates required tables if they don't exist.
-    Safe to call multiple times.
+    Bounded pool of long-lived SQLite connections.
+
+    A thread checks out one connection for its outermost `connection()`
+    block; nested blocks on the same thread reuse it. Idle connections are
+    handed out LIFO so a hot connection (and its statement cache) is reused.
+    Connections run in autocommit mode; use `transaction()` to group writes.
     """
-    conn = get_connection()
-    cur = conn.cursor()
 
-    # -------------------------
-    # USERS TABLE
-    # -------------------------
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE,
-        created_at TEXT
-    )
-    """)
+    def __init__(self, db_name, max_size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.db_name = db_name
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []
+        self._open_count = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
 
     # -------------------------
-    # AUTH TABLE
+    # CHECKOUT / RETURN
     # -------------------------
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS auth (
-        user_id INTEGER PRIMARY KEY,
-        password_hash BLOB,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_name,
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            cached_statements=256
+        )
+        _configure(conn)
+        return conn
 
+    def _acquire(self):
+        with self._cond:
+            while not self._idle and self._open_count >= self.max_size:
+                if not self._cond.wait(self.timeout):
+                    raise sqlite3.OperationalError(
+                        f"connection pool exhausted ({self.max_size} in use)"
+                    )
+            if self._idle:
+                return self._idle.pop()
+            self._open_count += 1
 
-    # -------------------------
-    # PROGRESS TABLE
-    # -------------------------
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS progress (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        topic TEXT,
-        accuracy REAL,
-        response_time REAL,
-        timestamp TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
+        try:
+            return self._open()
+        except Exception:
+            with self._cond:
+                self._open_count -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
 
     # -------------------------
-    # PREFERENCES TABLE
+    # PUBLIC API
     # -------------------------
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS preferences (
-        user_id INTEGER PRIMARY KEY,
-        learning_style TEXT,
-        difficulty TEXT,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )
-    """)
+    @contextmanager
+    def connection(self):
+        """Yield this thread's connection, checking one out if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Yield a connection inside `BEGIN IMMEDIATE ... COMMIT`.
+        Rolls back on error. Nested calls join the outer transaction.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def close(self):
+        """Close every idle connection (checked-out ones close on return)."""
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._open_count -= 1
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name=None):
+    """Return the shared pool for `db_name` (defaults to DB_NAME)."""
+    db_name = db_name or DB_NAME
+    pool = _pools.get(db_name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(db_name, ConnectionPool(db_name))
+    return pool
 
-    conn.commit()
-    conn.close()
+
+def connection():
+    """Context manager yielding a pooled connection (autocommit reads)."""
+    return get_pool().connection()
+
+
+def transaction():
+    """Context manager yielding a pooled connection inside a transaction."""
+    return get_pool().transaction()
+
+
+@atexit.register
+def close_all():
+    """Close all pooled connections (runs automatically at exit)."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+
+
+def get_connection():
+    """
+    Returns a standalone, unpooled SQLite connection with the standard pragmas.
+    check_same_thread=False is required for Streamlit.
+    Prefer `connection()` / `transaction()` in application code.
+    """
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+    _configure(conn)
+    return conn
+
+
+def init_db():
+    """
+    Creates required tables and applies pending schema migrations.
+    Upgrades existing databases in place. Safe to call multiple times.
+    """
+    with connection() as conn:
+        return migrate(conn)
+
+
+def chunked(items, size=MAX_PARAMS):
+    """Split a sequence into lists small enough for one `IN (?, ...)` clause."""
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def placeholders(n):
+    return ", ".join("?" * n)
 
 
 # Utility function (optional, helpful later)
 def now():
     return datetime.now().isoformat()
-
@@ -0,0 +1,105 @@
+import time
+
+from v2.database import connection, transaction
+from v2.knowledge_tracing import TOPIC_SKILL, mastered_sql
+from v2.rating_engine import RatingEngine
+
+# Bands in order; each update moves the level at most one band
+LEVELS = ("Easy", "Medium", "Hard")
+
+# Hard is entered on mastery and kept while P(mastered) stays at or above
+# this and Elo has not fallen to the Easy band, so one miss right after
+# mastering does not drop it. (BKT has no forgetting: after a long run of
+# right answers P(mastered) barely moves, so Elo decides the way down.)
+HARD_EXIT = 0.85
+
+
+class DifficultyState:
+    """
+    Current adaptive difficulty per (learner, topic), in learner_difficulty.
+
+    The level is re-derived whenever an answer is recorded, from the
+    topic's BKT mastery and Elo ability as they stand after that answer
+    (mastered -> "Hard", otherwise the band nearest TARGET_SUCCESS), with
+    hysteresis on leaving Hard and at most one band of movement per update.
+    Quiz start and resume then read it with one primary-key lookup instead
+    of recomputing it from session counters.
+    """
+
+    def __init__(self):
+        self.ratings = RatingEngine()
+
+    def level_for(self, mastered, rating, previous=None, mastery=None):
+        """
+        Next level from the post-answer state. `previous` is the stored
+        level (None if there is none yet), `mastery` the topic P(mastered).
+        """
+        band = self.ratings.difficulty_for(rating)
+        holding = (
+            previous == "Hard" and band != "Easy"
+            and mastery is not None and mastery >= HARD_EXIT
+        )
+        target = "Hard" if mastered or holding else band
+
+        if previous not in LEVELS:
+            return target
+        current = LEVELS.index(previous)
+        step = max(-1, min(1, LEVELS.index(target) - current))
+        return LEVELS[current + step]
+
+    # -------------------------
+    # WRITE PATH
+    # -------------------------
+    def apply_answers(self, conn, rows):
+        """
+        Re-derive the level of every (user_id, topic) in answer rows. Must
+        run after the ratings and mastery updates; caller owns the transaction.
+        """
+        cur = conn.cursor()
+        levels = []
+
+        # Stamped with the latest answer's time, so replays are deterministic
+        answered = {}
+        for r in rows:
+            answered[(r[0], r[1])] = max(answered.get((r[0], r[1]), r[5]), r[5])
+
+        for (user_id, topic), ts in answered.items():
+            cur.execute(f"""
+                SELECT a.rating, COALESCE({mastered_sql("k.")}, 0), k.p_mastery, d.difficulty
+                FROM learner_ability a
+                LEFT JOIN knowledge_state k
+                  ON k.user_id = a.user_id AND k.topic = a.topic AND k.subtopic = ?
+                LEFT JOIN learner_difficulty d
+                  ON d.user_id = a.user_id AND d.topic = a.topic
+                WHERE a.user_id = ? AND a.topic = ?
+            """, (TOPIC_SKILL, user_id, topic))
+            row = cur.fetchone()
+            if row is None:
+                continue
+            rating, mastered, mastery, previous = row
+            levels.append((user_id, topic, self.level_for(mastered, rating, previous, mastery), ts))
+
+        cur.executemany("""
+            INSERT OR REPLACE INTO learner_difficulty (user_id, topic, difficulty, updated_ts)
+            VALUES (?, ?, ?, ?)
+        """, levels)
+
+    def set(self, student_id, topic, difficulty):
+        """Store a level derived elsewhere (learners whose answers predate the table)."""
+        with transaction() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO learner_difficulty (user_id, topic, difficulty, updated_ts)
+                VALUES (?, ?, ?, ?)
+            """, (student_id, topic, difficulty, int(time.time())))
+
+    # -------------------------
+    # READS
+    # -------------------------
+    def get(self, student_id, topic):
+        """Stored level, or None if none has been derived yet."""
+        with connection() as conn:
+            row = conn.execute("""
+                SELECT difficulty FROM learner_difficulty
+                WHERE user_id = ? AND topic = ?
+            """, (student_id, topic)).fetchone()
+        return row[0] if row else None
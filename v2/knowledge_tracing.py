@@ -0,0 +1,195 @@
+import numpy as np
+
+from v2.database import connection
+
+# -------------------------
+# MODEL PARAMETERS
+# -------------------------
+# Bayesian Knowledge Tracing, one hidden "mastered" state per skill.
+# Parameter tuples are (p_init, p_learn, p_slip, p_guess). Unfitted skills
+# use a low guess rate and a slip rate well above zero, so a few lucky
+# answers do not look like mastery.
+DEFAULT_PARAMS = (0.1, 0.1, 0.15, 0.15)
+
+# A skill counts as mastered once P(mastered) reaches this, over at least
+# MIN_OBSERVATIONS answers of which at least MASTERY_ACCURACY were right.
+# BKT has no forgetting, so P(mastered) alone creeps upward for any learner
+# who keeps answering; the count and accuracy gates keep it honest.
+MASTERY_THRESHOLD = 0.95
+MIN_OBSERVATIONS = 8
+MASTERY_ACCURACY = 0.8
+
+# Subtopic key of the topic-wide skill (every answer in the topic updates it)
+TOPIC_SKILL = ""
+
+# Grid searched by fit(); every combination is evaluated in one pass
+FIT_GRID = {
+    "p_init": (0.1, 0.3, 0.5),
+    "p_learn": (0.05, 0.1, 0.2, 0.3),
+    "p_slip": (0.1, 0.15, 0.2),
+    "p_guess": (0.1, 0.15, 0.2),
+}
+
+
+def is_mastered(p_mastery, n, correct):
+    """The one definition of a mastered skill (see MASTERY_THRESHOLD)."""
+    return (
+        p_mastery >= MASTERY_THRESHOLD
+        and n >= MIN_OBSERVATIONS
+        and correct >= MASTERY_ACCURACY * n
+    )
+
+
+def mastered_sql(prefix=""):
+    """is_mastered as an SQL predicate over knowledge_state columns (`prefix` e.g. "k.")."""
+    return (
+        f"({prefix}p_mastery >= {MASTERY_THRESHOLD}"
+        f" AND {prefix}n >= {MIN_OBSERVATIONS}"
+        f" AND {prefix}correct >= {MASTERY_ACCURACY} * {prefix}n)"
+    )
+
+
+def observe(p, correct, p_learn, p_slip, p_guess):
+    """
+    One BKT step: condition P(mastered) on the answer, then apply the
+    learning transition. Works on scalars and on NumPy arrays.
+    """
+    known_right = p * (1 - p_slip)
+    known_wrong = p * p_slip
+    posterior = np.where(
+        correct,
+        known_right / (known_right + (1 - p) * p_guess),
+        known_wrong / (known_wrong + (1 - p) * (1 - p_guess))
+    )
+    return posterior + (1 - posterior) * p_learn
+
+
+def replay(seq, correct, p_init, p_learn, p_slip, p_guess):
+    """
+    Run BKT over many answer sequences at once.
+
+    `seq` holds a sequence id (0..S-1) per answer, sorted so each sequence
+    is contiguous and in time order; `correct` is the matching boolean
+    array. Parameters may be scalars, or arrays of shape (G, 1) to evaluate
+    G parameter sets together.
+
+    The loop runs over answer positions, not answers: step t updates the
+    t-th answer of every sequence in one vectorized operation.
+
+    Returns (final P(mastered) of shape (..., S), log-likelihood of shape (...)).
+    """
+    seq = np.asarray(seq)
+    correct = np.asarray(correct, dtype=bool)
+    n_seq = int(seq.max()) + 1 if len(seq) else 0
+
+    starts = np.flatnonzero(np.r_[True, seq[1:] != seq[:-1]])
+    lengths = np.diff(np.r_[starts, len(seq)])
+    position = np.arange(len(seq)) - np.repeat(starts, lengths)
+
+    order = np.lexsort((seq, position))
+    bounds = np.searchsorted(position[order], np.arange(lengths.max(initial=0) + 1))
+
+    shape = np.broadcast_shapes(np.shape(p_init), np.shape(p_learn),
+                                np.shape(p_slip), np.shape(p_guess))
+    p = np.zeros(np.broadcast_shapes(shape, (n_seq,))) + p_init
+    loglik = np.zeros(p.shape[:-1])
+
+    for t in range(len(bounds) - 1):
+        idx = order[bounds[t]:bounds[t + 1]]
+        s, c = seq[idx], correct[idx]
+
+        current = p[..., s]
+        p_correct = current * (1 - p_slip) + (1 - current) * p_guess
+        loglik += np.log(np.where(c, p_correct, 1 - p_correct)).sum(axis=-1)
+        p[..., s] = observe(current, c, p_learn, p_slip, p_guess)
+
+    return p, loglik
+
+
+def fit(seq, correct, grid=FIT_GRID):
+    """
+    Maximum-likelihood parameters over `grid`, all combinations replayed
+    in one vectorized pass. Returns (params tuple, final P(mastered) per sequence).
+    """
+    mesh = np.meshgrid(*grid.values(), indexing="ij")
+    columns = [m.reshape(-1, 1) for m in mesh]
+
+    # Guessing must stay below knowing, or the model is not identifiable
+    valid = (columns[3] < 1 - columns[2]).ravel()
+    columns = [c[valid] for c in columns]
+
+    mastery, loglik = replay(seq, correct, *columns)
+    best = int(np.argmax(loglik))
+    return tuple(float(c[best, 0]) for c in columns), mastery[best]
+
+
+class KnowledgeTracer:
+    """
+    Online BKT: one P(mastered), with answer and correct counts, per
+    (learner, topic, subtopic) in the knowledge_state table, updated in O(1)
+    per answer. Per-skill parameters come from bkt_params (written by the
+    replay job) or DEFAULT_PARAMS.
+    """
+
+    # -------------------------
+    # WRITE PATH
+    # -------------------------
+    def apply_answers(self, conn, rows):
+        """
+        Update mastery for answer rows
+        `(user_id, topic, accuracy, response_time, timestamp, ts, question_id, difficulty, subtopic, ...)`
+        in order. Caller owns the transaction.
+        """
+        cur = conn.cursor()
+        params, states = {}, {}
+
+        for user_id, topic, accuracy, _, _, _, _, _, subtopic, *_ in rows:
+            correct = accuracy == 100
+            skills = [TOPIC_SKILL] if not subtopic else [TOPIC_SKILL, subtopic]
+
+            for skill in skills:
+                if (topic, skill) not in params:
+                    params[(topic, skill)] = self._params(cur, topic, skill)
+                p_init, p_learn, p_slip, p_guess = params[(topic, skill)]
+
+                key = (user_id, topic, skill)
+                if key not in states:
+                    cur.execute("""
+                        SELECT p_mastery, n, correct FROM knowledge_state
+                        WHERE user_id = ? AND topic = ? AND subtopic = ?
+                    """, key)
+                    states[key] = cur.fetchone() or (p_init, 0, 0)
+
+                p, n, right = states[key]
+                states[key] = (
+                    float(observe(p, correct, p_learn, p_slip, p_guess)), n + 1, right + correct
+                )
+
+        cur.executemany("""
+            INSERT OR REPLACE INTO knowledge_state (user_id, topic, subtopic, p_mastery, n, correct)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [key + state for key, state in states.items()])
+
+    def _params(self, cur, topic, subtopic):
+        cur.execute("""
+            SELECT p_init, p_learn, p_slip, p_guess FROM bkt_params
+            WHERE topic = ? AND subtopic = ?
+        """, (topic, subtopic))
+        return cur.fetchone() or DEFAULT_PARAMS
+
+    # -------------------------
+    # READS
+    # -------------------------
+    def get_mastered(self, student_id, topic=None):
+        """{(topic, subtopic)} of the learner's mastered skills, optionally for one topic."""
+        clause, params = "user_id = ?", [student_id]
+        if topic is not None:
+            clause += " AND topic = ?"
+            params.append(topic)
+
+        with connection() as conn:
+            rows = conn.execute(f"""
+                SELECT topic, subtopic FROM knowledge_state
+                WHERE {clause} AND {mastered_sql()}
+            """, params).fetchall()
+        return set(rows)
@@ -1,5 +1,51 @@
 import numpy as np
-from v2.database import get_connection
+from v2.database import chunked, connection, placeholders, transaction
+from v2.progress_tracker_v2 import bump_progress_version, sync_pending
+
+
+def derive_traits(count, mean_accuracy, mean_time):
+    """
+    Vectorized profile traits from per-learner running means
+    (equal-length arrays). Returns {profile_key: list}, one entry per learner.
+    Rows with count == 0 yield placeholder values the caller should ignore.
+    """
+    total = np.asarray(count, dtype=float)
+    accuracy = np.round(np.asarray(mean_accuracy, dtype=float), 2)
+    avg_time = np.round(np.asarray(mean_time, dtype=float), 2)
+
+    # PACE
+    pace = np.select([avg_time < 30, avg_time > 90], ["Fast", "Slow"], "Moderate")
+
+    # ENGAGEMENT / CONFIDENCE
+    engagement = np.select([accuracy >= 80, accuracy < 50], ["High", "Low"], "Medium")
+    confidence = np.select([accuracy >= 75, accuracy < 50], ["High", "Low"], "Medium")
+
+    # OVERALL SCORE (≠ accuracy): accuracy, speed & consistency
+    score = (
+        accuracy * 0.6 +
+        np.maximum(0, 100 - avg_time) * 0.25 +
+        np.minimum(total * 2, 20)
+    )
+    score = np.round(np.minimum(score, 100), 2)
+
+    # LEVEL & BADGE
+    level = np.select([score >= 85, score >= 60], ["Advanced", "Intermediate"], "Beginner")
+    badge = np.select(
+        [score >= 90, score >= 75, score >= 60],
+        ["🏆 Master", "🔥 Pro Learner", "🚀 Improving"],
+        "🌱 Starter"
+    )
+
+    return {
+        "average_accuracy": accuracy.tolist(),
+        "average_time": avg_time.tolist(),
+        "pace": pace.tolist(),
+        "engagement": engagement.tolist(),
+        "confidence": confidence.tolist(),
+        "overall_score": score.tolist(),
+        "level": level.tolist(),
+        "badge": badge.tolist(),
+    }
 
 
 class LearnerProfiler:
@@ -14,17 +60,16 @@ class LearnerProfiler:
 
     def get_profile(self, student_id):
         """Fetch profile or return default"""
-        conn = get_connection()
-        cur = conn.cursor()
+        with connection() as conn:
+            cur = conn.cursor()
 
-        cur.execute("""
-        SELECT learning_style, difficulty
-        FROM preferences
-        WHERE user_id = ?
-        """, (student_id,))
+            cur.execute("""
+            SELECT learning_style, difficulty
+            FROM preferences
+            WHERE user_id = ?
+            """, (student_id,))
 
-        row = cur.fetchone()
-        conn.close()
+            row = cur.fetchone()
 
         profile = self._create_default_profile()
 
@@ -35,78 +80,75 @@ class LearnerProfiler:
         return profile
 
     def update_profile(self, student_id):
-        """Recompute learner profile from progress table"""
-        conn = get_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-        SELECT accuracy, response_time
-        FROM progress
-        WHERE user_id = ?
-        """, (student_id,))
-
-        rows = cur.fetchall()
-        conn.close()
-
-        profile = self.get_profile(student_id)
-
-        if not rows:
-            return profile
-
-        accuracies = [r[0] for r in rows if r[0] is not None]
-        times = [r[1] for r in rows if r[1] is not None]
-
-        profile["total_activities"] = len(accuracies)
-        profile["average_accuracy"] = round(np.mean(accuracies), 2)
-        profile["average_time"] = round(np.mean(times), 2)
-
-        # -------------------------
-        # PACE
-        # -------------------------
-        if profile["average_time"] < 30:
-            profile["pace"] = "Fast"
-        elif profile["average_time"] > 90:
-            profile["pace"] = "Slow"
-        else:
-            profile["pace"] = "Moderate"
-
-        # -------------------------
-        # ENGAGEMENT
-        # -------------------------
-        if profile["average_accuracy"] >= 80:
-            profile["engagement"] = "High"
-        elif profile["average_accuracy"] < 50:
-            profile["engagement"] = "Low"
-        else:
-            profile["engagement"] = "Medium"
-
-        # -------------------------
-        # CONFIDENCE
-        # -------------------------
-        if profile["average_accuracy"] >= 75:
-            profile["confidence"] = "High"
-        elif profile["average_accuracy"] < 50:
-            profile["confidence"] = "Low"
-        else:
-            profile["confidence"] = "Medium"
-
-        # -------------------------
-        # OVERALL SCORE (DIFFERENT FROM ACCURACY)
-        # -------------------------
-        profile["overall_score"] = self._calculate_overall_score(profile)
-
-        # -------------------------
-        # LEVEL & BADGE
-        # -------------------------
-        profile["level"] = self._get_level(profile["overall_score"])
-        profile["badge"] = self._get_badge(profile["overall_score"])
-
-        # -------------------------
-        # STRENGTHS & WEAKNESSES
-        # -------------------------
-        self._update_strengths_weaknesses(profile)
+        """Learner profile from the persisted running statistics"""
+        return self.update_profiles_many([student_id])[student_id]
 
-        return profile
+    def update_profiles_many(self, student_ids):
+        """
+        Recompute profiles for many learners at once.
+        Reads each learner's running state (O(1) per learner, no history
+        scan) plus preferences, one query each per chunk of ids; traits are
+        derived for the whole set in vectorized NumPy.
+        Returns {student_id: profile}.
+        """
+        ids = list(dict.fromkeys(student_ids))
+        for sid in ids:
+            sync_pending(sid)
+
+        states, prefs = {}, {}
+        with connection() as conn:
+            cur = conn.cursor()
+
+            for chunk in chunked(ids):
+                marks = placeholders(len(chunk))
+
+                cur.execute(f"""
+                SELECT user_id, n, acc_mean, acc_m2, time_mean, time_m2, ewma_accuracy
+                FROM learner_state
+                WHERE user_id IN ({marks})
+                """, chunk)
+                for user_id, *state in cur.fetchall():
+                    states[user_id] = state
+
+                cur.execute(f"""
+                SELECT user_id, learning_style, difficulty
+                FROM preferences
+                WHERE user_id IN ({marks})
+                """, chunk)
+                for user_id, style, difficulty in cur.fetchall():
+                    prefs[user_id] = (style, difficulty)
+
+        state = np.array(
+            [states.get(sid, (0, 0, 0, 0, 0, 0)) for sid in ids],
+            dtype=float
+        ).reshape(len(ids), 6)
+        n, acc_mean, acc_m2, time_mean, time_m2, ewma = state.T
+
+        traits = derive_traits(n, acc_mean, time_mean)
+
+        # Population standard deviations from Welford's M2
+        safe_n = np.where(n > 0, n, 1)
+        traits["accuracy_std"] = np.round(np.sqrt(acc_m2 / safe_n), 2).tolist()
+        traits["time_std"] = np.round(np.sqrt(time_m2 / safe_n), 2).tolist()
+        traits["recent_accuracy"] = np.round(ewma, 2).tolist()
+
+        profiles = {}
+        for i, sid in enumerate(ids):
+            profile = self._create_default_profile()
+
+            if sid in prefs:
+                profile["style"] = prefs[sid][0] or "Visual"
+                profile["preferred_difficulty"] = prefs[sid][1] or "Medium"
+
+            if n[i] > 0:
+                profile["total_activities"] = int(n[i])
+                for key, values in traits.items():
+                    profile[key] = values[i]
+                self._update_strengths_weaknesses(profile)
+
+            profiles[sid] = profile
+
+        return profiles
 
     # -------------------------
     # INTERNAL HELPERS
@@ -124,39 +166,14 @@ class LearnerProfiler:
             "total_activities": 0,
             "average_accuracy": 0,
             "average_time": 0,
+            "accuracy_std": 0,
+            "time_std": 0,
+            "recent_accuracy": 0,
             "overall_score": 0,
             "level": "Beginner",
             "badge": "🌱 Starter"
         }
 
-    def _calculate_overall_score(self, profile):
-        """
-        Overall score ≠ accuracy
-        Combines accuracy, speed & consistency
-        """
-        score = (
-            profile["average_accuracy"] * 0.6 +
-            max(0, 100 - profile["average_time"]) * 0.25 +
-            min(profile["total_activities"] * 2, 20)
-        )
-        return round(min(score, 100), 2)
-
-    def _get_level(self, score):
-        if score >= 85:
-            return "Advanced"
-        elif score >= 60:
-            return "Intermediate"
-        return "Beginner"
-
-    def _get_badge(self, score):
-        if score >= 90:
-            return "🏆 Master"
-        elif score >= 75:
-            return "🔥 Pro Learner"
-        elif score >= 60:
-            return "🚀 Improving"
-        return "🌱 Starter"
-
     def _update_strengths_weaknesses(self, profile):
         profile["strengths"].clear()
         profile["weaknesses"].clear()
@@ -180,21 +197,21 @@ class LearnerProfiler:
     # -------------------------
 
     def update_preferences(self, student_id, preferences):
-        conn = get_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-        INSERT OR REPLACE INTO preferences
-        (user_id, learning_style, difficulty)
-        VALUES (?, ?, ?)
-        """, (
-            student_id,
-            preferences.get("style"),
-            preferences.get("preferred_difficulty")
-        ))
-
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            cur = conn.cursor()
+
+            cur.execute("""
+            INSERT OR REPLACE INTO preferences
+            (user_id, learning_style, difficulty)
+            VALUES (?, ?, ?)
+            """, (
+                student_id,
+                preferences.get("style"),
+                preferences.get("preferred_difficulty")
+            ))
+
+            # Cached snapshots embed the profile, so invalidate them too
+            bump_progress_version(conn, [student_id])
 
     def get_all_topic_progress(self, student_id):
         """
@@ -0,0 +1,63 @@
+from v2.database import connection
+from v2.progress_tracker_v2 import synced
+
+
+class LearnerSnapshot:
+    """
+    Read-only bundle of everything the sidebar, dashboard and recommendations
+    need for one learner, built once per rerun.
+
+    A snapshot is tagged with the learner's progress_version. Re-resolving it
+    costs a single keyed lookup while the version is unchanged; the data is
+    only re-read after a new answer, a reset or a preference change.
+    """
+
+    RECENT_LIMIT = 5
+
+    def __init__(self, student_id, version, progress, profile, overall_score, recent_activity):
+        self.student_id = student_id
+        self.version = version
+        self.progress = progress
+        self.profile = profile
+        self.overall_score = overall_score
+        self.recent_activity = recent_activity
+
+    @classmethod
+    def load(cls, student_id, tracker, profiler, previous=None):
+        """
+        Return `previous` if it is still current, otherwise build a fresh
+        snapshot. All reads share one pooled connection, checked out only
+        after the learner's queued answers are committed.
+        """
+        with synced(student_id), connection():
+            version = tracker.get_progress_version(student_id)
+
+            if (
+                previous is not None
+                and previous.student_id == student_id
+                and previous.version == version
+            ):
+                return previous
+
+            return cls.read(student_id, version, tracker, profiler)
+
+    @classmethod
+    def read(cls, student_id, version, tracker, profiler):
+        """
+        Build a snapshot tagged `version` without checking it. Call it in
+        the transaction that read (or wrote) that version, so the data and
+        the tag come from the same commit.
+        """
+        with synced(student_id), connection():
+            progress = tracker.get_student_progress(student_id)
+            profile = profiler.get_profile(student_id)
+            recent = tracker.get_recent_activity(student_id, limit=cls.RECENT_LIMIT)
+
+        return cls(
+            student_id,
+            version,
+            progress,
+            profile,
+            tracker.compute_overall_score(student_id, progress),
+            recent
+        )
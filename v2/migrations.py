@@ -0,0 +1,446 @@
+"""
+Versioned schema migrations (v2).
+
+The schema version lives in `PRAGMA user_version`. Each migration runs in
+its own transaction together with the version bump, so a crash leaves the
+database at the last fully applied version. Existing databases created by
+the old `init_db()` sit at version 0 and are upgraded in place.
+"""
+
+
+# Smoothing factor for the recency-weighted accuracy (shared with the write path)
+EWMA_ALPHA = 0.1
+
+
+# -------------------------
+# HELPERS
+# -------------------------
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _set_version(conn, version):
+    # PRAGMA does not accept bound parameters
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+
+
+def _has_column(cur, table, column):
+    cur.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cur.fetchall())
+
+
+def _add_column(cur, table, column, decl):
+    """ALTER TABLE ... ADD COLUMN, skipped if the column already exists."""
+    if not _has_column(cur, table, column):
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+# -------------------------
+# MIGRATIONS
+# -------------------------
+
+def _m001_base_tables(cur):
+    """Original v2 tables (no-op on databases created by the old init_db)."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        created_at TEXT
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS auth (
+        user_id INTEGER PRIMARY KEY,
+        password_hash BLOB,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS progress (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        topic TEXT,
+        accuracy REAL,
+        response_time REAL,
+        timestamp TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS preferences (
+        user_id INTEGER PRIMARY KEY,
+        learning_style TEXT,
+        difficulty TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+
+def _m002_progress_indexes(cur):
+    """Composite indexes for per-user, per-topic and time-ordered reads."""
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_progress_user_topic
+    ON progress (user_id, topic)
+    """)
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_progress_user_timestamp
+    ON progress (user_id, timestamp)
+    """)
+
+
+def _m003_progress_rollup(cur):
+    """Per-(user, topic) aggregates maintained on every recorded answer."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS progress_rollup (
+        user_id INTEGER NOT NULL,
+        topic TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        sum_accuracy REAL NOT NULL DEFAULT 0,
+        sum_time REAL NOT NULL DEFAULT 0,
+        sum_time_sq REAL NOT NULL DEFAULT 0,
+        first_ts TEXT,
+        last_ts TEXT,
+        PRIMARY KEY (user_id, topic)
+    ) WITHOUT ROWID
+    """)
+
+    # Backfill from existing answers
+    cur.execute("""
+    INSERT OR REPLACE INTO progress_rollup
+    SELECT user_id,
+        topic,
+        COUNT(*),
+        SUM(CASE WHEN accuracy = 100 THEN 1 ELSE 0 END),
+        COALESCE(SUM(accuracy), 0),
+        COALESCE(SUM(response_time), 0),
+        COALESCE(SUM(response_time * response_time), 0),
+        MIN(timestamp),
+        MAX(timestamp)
+    FROM progress
+    WHERE user_id IS NOT NULL AND topic IS NOT NULL
+    GROUP BY user_id, topic
+    """)
+
+
+def _m004_progress_epoch(cur):
+    """
+    Integer epoch seconds (UTC) alongside the legacy ISO `timestamp` text,
+    indexed for time-window queries. `timestamp` stays readable.
+    """
+    _add_column(cur, "progress", "ts", "INTEGER")
+
+    # Legacy timestamps are naive local time; 'utc' converts them to UTC
+    cur.execute("""
+    UPDATE progress
+    SET ts = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)
+    WHERE ts IS NULL AND timestamp IS NOT NULL
+    """)
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_progress_user_ts
+    ON progress (user_id, ts)
+    """)
+
+    # Superseded by idx_progress_user_ts
+    cur.execute("DROP INDEX IF EXISTS idx_progress_user_timestamp")
+
+
+def _m005_learner_state(cur):
+    """Per-learner state row; progress_version changes whenever data does."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS learner_state (
+        user_id INTEGER PRIMARY KEY,
+        progress_version INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+
+def _m006_progress_topic_ts_index(cur):
+    """(user_id, topic, ts) serves per-topic lookups and topic-filtered paging."""
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_progress_user_topic_ts
+    ON progress (user_id, topic, ts)
+    """)
+
+    # Prefix of the new index
+    cur.execute("DROP INDEX IF EXISTS idx_progress_user_topic")
+
+
+def _m007_learner_running_stats(cur):
+    """
+    Running per-learner statistics: count, Welford mean / M2 for accuracy
+    and response time, and an EWMA of accuracy. Backfilled from history.
+    """
+    for column in ("n", "acc_mean", "acc_m2", "time_mean", "time_m2", "ewma_accuracy"):
+        decl = "INTEGER NOT NULL DEFAULT 0" if column == "n" else "REAL NOT NULL DEFAULT 0"
+        _add_column(cur, "learner_state", column, decl)
+
+    # M2 = sum(x^2) - n * mean^2, clamped against rounding below zero
+    cur.execute("""
+    INSERT INTO learner_state (user_id, n, acc_mean, acc_m2, time_mean, time_m2)
+    SELECT user_id,
+        COUNT(*),
+        AVG(COALESCE(accuracy, 0)),
+        MAX(0, SUM(COALESCE(accuracy, 0) * COALESCE(accuracy, 0))
+            - COUNT(*) * AVG(COALESCE(accuracy, 0)) * AVG(COALESCE(accuracy, 0))),
+        AVG(COALESCE(response_time, 0)),
+        MAX(0, SUM(COALESCE(response_time, 0) * COALESCE(response_time, 0))
+            - COUNT(*) * AVG(COALESCE(response_time, 0)) * AVG(COALESCE(response_time, 0)))
+    FROM progress
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id
+    ON CONFLICT(user_id) DO UPDATE SET
+        n = excluded.n,
+        acc_mean = excluded.acc_mean,
+        acc_m2 = excluded.acc_m2,
+        time_mean = excluded.time_mean,
+        time_m2 = excluded.time_m2
+    """)
+
+    # The EWMA is order dependent, so replay answers oldest first
+    ewma = {}
+    cur.execute("""
+    SELECT user_id, COALESCE(accuracy, 0)
+    FROM progress
+    WHERE user_id IS NOT NULL
+    ORDER BY user_id, ts, id
+    """)
+    for user_id, accuracy in cur:
+        prev = ewma.get(user_id)
+        ewma[user_id] = accuracy if prev is None else prev + EWMA_ALPHA * (accuracy - prev)
+
+    cur.executemany(
+        "UPDATE learner_state SET ewma_accuracy = ? WHERE user_id = ?",
+        [(value, user_id) for user_id, value in ewma.items()]
+    )
+
+
+def _m008_learner_profiles(cur):
+    """Materialized profiles written by the batch recompute job."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS learner_profiles (
+        user_id INTEGER PRIMARY KEY,
+        total_activities INTEGER NOT NULL,
+        average_accuracy REAL NOT NULL,
+        average_time REAL NOT NULL,
+        accuracy_std REAL NOT NULL,
+        time_std REAL NOT NULL,
+        pace TEXT NOT NULL,
+        engagement TEXT NOT NULL,
+        confidence TEXT NOT NULL,
+        overall_score REAL NOT NULL,
+        level TEXT NOT NULL,
+        badge TEXT NOT NULL,
+        computed_at INTEGER NOT NULL,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    """)
+
+
+def _m009_ratings(cur):
+    """Elo ratings: learner ability per topic, difficulty per question."""
+    _add_column(cur, "progress", "question_id", "INTEGER")
+    _add_column(cur, "progress", "difficulty", "TEXT")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS learner_ability (
+        user_id INTEGER NOT NULL,
+        topic TEXT NOT NULL,
+        rating REAL NOT NULL DEFAULT 0,
+        n INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, topic)
+    ) WITHOUT ROWID
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS item_difficulty (
+        question_id INTEGER PRIMARY KEY,
+        topic TEXT,
+        label TEXT,
+        rating REAL NOT NULL DEFAULT 0,
+        n INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+
+def _m010_knowledge_tracing(cur):
+    """
+    BKT mastery per (learner, topic, subtopic) and fitted parameters per
+    skill. States are filled online and by `python -m v2.replay_knowledge`.
+    """
+    _add_column(cur, "progress", "subtopic", "TEXT")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS knowledge_state (
+        user_id INTEGER NOT NULL,
+        topic TEXT NOT NULL,
+        subtopic TEXT NOT NULL DEFAULT '',
+        p_mastery REAL NOT NULL,
+        n INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, topic, subtopic)
+    ) WITHOUT ROWID
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS bkt_params (
+        topic TEXT NOT NULL,
+        subtopic TEXT NOT NULL DEFAULT '',
+        p_init REAL NOT NULL,
+        p_learn REAL NOT NULL,
+        p_slip REAL NOT NULL,
+        p_guess REAL NOT NULL,
+        n_answers INTEGER NOT NULL DEFAULT 0,
+        fitted_at INTEGER,
+        PRIMARY KEY (topic, subtopic)
+    ) WITHOUT ROWID
+    """)
+
+
+def _m011_review_cards(cur):
+    """Spaced-repetition cards; due items are range scans on due_at."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS review_cards (
+        user_id INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        topic TEXT NOT NULL,
+        ease REAL NOT NULL,
+        interval_days REAL NOT NULL,
+        reps INTEGER NOT NULL DEFAULT 0,
+        lapses INTEGER NOT NULL DEFAULT 0,
+        last_ts INTEGER NOT NULL,
+        due_at INTEGER NOT NULL,
+        PRIMARY KEY (user_id, question_id)
+    ) WITHOUT ROWID
+    """)
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_review_user_due
+    ON review_cards(user_id, due_at)
+    """)
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_review_user_topic_due
+    ON review_cards(user_id, topic, due_at)
+    """)
+
+
+def _m012_item_correct(cur):
+    """Correct-answer count per question (bandit posteriors warm-start from it)."""
+    _add_column(cur, "item_difficulty", "correct", "INTEGER NOT NULL DEFAULT 0")
+
+    cur.execute("""
+    UPDATE item_difficulty
+    SET correct = (
+        SELECT COUNT(*) FROM progress
+        WHERE progress.question_id = item_difficulty.question_id
+          AND progress.accuracy = 100
+    )
+    """)
+
+
+def _m013_recommendation_cache(cur):
+    """Optionally persisted recommendations, keyed by progress_version."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS recommendation_cache (
+        user_id INTEGER PRIMARY KEY,
+        progress_version INTEGER NOT NULL,
+        valid_until INTEGER,
+        payload TEXT NOT NULL,
+        computed_at INTEGER NOT NULL
+    )
+    """)
+
+
+def _m014_learner_difficulty(cur):
+    """Adaptive difficulty per (learner, topic), maintained on every answer."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS learner_difficulty (
+        user_id INTEGER NOT NULL,
+        topic TEXT NOT NULL,
+        difficulty TEXT NOT NULL,
+        updated_ts INTEGER NOT NULL,
+        PRIMARY KEY (user_id, topic)
+    ) WITHOUT ROWID
+    """)
+
+
+def _m015_knowledge_correct(cur):
+    """Correct-answer count per BKT skill (mastery requires enough of them)."""
+    _add_column(cur, "knowledge_state", "correct", "INTEGER NOT NULL DEFAULT 0")
+
+    cur.execute("""
+    UPDATE knowledge_state
+    SET correct = (
+        SELECT COUNT(*) FROM progress
+        WHERE progress.user_id = knowledge_state.user_id
+          AND progress.topic = knowledge_state.topic
+          AND (knowledge_state.subtopic = '' OR progress.subtopic = knowledge_state.subtopic)
+          AND progress.accuracy = 100
+    )
+    """)
+
+
+def _m016_drop_learner_profiles(cur):
+    """Profiles are derived from learner_state on read; the batch-written copy had no readers."""
+    cur.execute("DROP TABLE IF EXISTS learner_profiles")
+
+
+# Ordered list of (version, migration). Append only — never renumber.
+MIGRATIONS = [
+    (1, _m001_base_tables),
+    (2, _m002_progress_indexes),
+    (3, _m003_progress_rollup),
+    (4, _m004_progress_epoch),
+    (5, _m005_learner_state),
+    (6, _m006_progress_topic_ts_index),
+    (7, _m007_learner_running_stats),
+    (8, _m008_learner_profiles),
+    (9, _m009_ratings),
+    (10, _m010_knowledge_tracing),
+    (11, _m011_review_cards),
+    (12, _m012_item_correct),
+    (13, _m013_recommendation_cache),
+    (14, _m014_learner_difficulty),
+    (15, _m015_knowledge_correct),
+    (16, _m016_drop_learner_profiles),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# -------------------------
+# RUNNER
+# -------------------------
+
+def migrate(conn):
+    """
+    Apply every pending migration on an autocommit connection.
+    Safe to call concurrently: the version is re-checked under the write lock.
+    Returns the resulting schema version.
+    """
+    for version, step in MIGRATIONS:
+        if get_version(conn) >= version:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_version(conn) < version:
+                step(conn.cursor())
+                _set_version(conn, version)
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    # Refresh planner statistics for any newly created indexes
+    conn.execute("PRAGMA optimize")
+
+    return get_version(conn)
@@ -1,137 +1,462 @@
+import atexit
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from v2.database import get_connection, now
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from v2.database import chunked, connection, placeholders, transaction, now
+from v2.difficulty_state import DifficultyState
+from v2.migrations import EWMA_ALPHA
+from v2.knowledge_tracing import KnowledgeTracer, mastered_sql
+from v2.rating_engine import RatingEngine
+from v2.spaced_repetition import ReviewScheduler
+from v2.write_behind import WriteBehindQueue
+
+
+# Folds one answer into its (user, topic) rollup row
+ROLLUP_UPSERT_SQL = """
+    INSERT INTO progress_rollup (
+        user_id, topic, attempts, correct, sum_accuracy,
+        sum_time, sum_time_sq, first_ts, last_ts
+    ) VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, topic) DO UPDATE SET
+        attempts = attempts + 1,
+        correct = correct + excluded.correct,
+        sum_accuracy = sum_accuracy + excluded.sum_accuracy,
+        sum_time = sum_time + excluded.sum_time,
+        sum_time_sq = sum_time_sq + excluded.sum_time_sq,
+        last_ts = MAX(last_ts, excluded.last_ts)
+"""
+
+
+# Compact row layout for streamed history pages
+HISTORY_COLUMNS = ("id", "ts", "topic", "accuracy", "response_time")
+HISTORY_DTYPE = np.dtype([
+    ("id", "i8"),
+    ("ts", "i8"),
+    ("topic", object),          # catalog topics have no length limit
+    ("accuracy", "f4"),
+    ("response_time", "f4"),
+])
+HISTORY_PAGE_SIZE = 500
+
+# Any change to a learner's answers or preferences bumps this counter;
+# caches compare it to decide whether they are stale
+BUMP_VERSION_SQL = """
+    INSERT INTO learner_state (user_id, progress_version) VALUES (?, 1)
+    ON CONFLICT(user_id) DO UPDATE SET progress_version = progress_version + 1
+"""
+
+
+# O(1) per-answer update of the learner's running statistics.
+# Welford: mean' = mean + d / (n + 1), M2' = M2 + d * (x - mean'), d = x - mean.
+# All right-hand sides see the pre-update row, so mean' is spelled out.
+STATE_UPSERT_SQL = f"""
+    INSERT INTO learner_state (
+        user_id, n, acc_mean, acc_m2, time_mean, time_m2, ewma_accuracy
+    ) VALUES (?, 1, ?, 0, ?, 0, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        n = n + 1,
+        acc_mean = acc_mean + (excluded.acc_mean - acc_mean) / (n + 1),
+        acc_m2 = acc_m2 + (excluded.acc_mean - acc_mean) * (
+            excluded.acc_mean - (acc_mean + (excluded.acc_mean - acc_mean) / (n + 1))
+        ),
+        time_mean = time_mean + (excluded.time_mean - time_mean) / (n + 1),
+        time_m2 = time_m2 + (excluded.time_mean - time_mean) * (
+            excluded.time_mean - (time_mean + (excluded.time_mean - time_mean) / (n + 1))
+        ),
+        ewma_accuracy = CASE
+            WHEN n = 0 THEN excluded.ewma_accuracy
+            ELSE ewma_accuracy + {EWMA_ALPHA} * (excluded.ewma_accuracy - ewma_accuracy)
+        END
+"""
+
+
+def state_params(student_id, topic, accuracy, response_time, *_):
+    """Parameters for STATE_UPSERT_SQL from a single progress row."""
+    accuracy = float(accuracy or 0)
+    return (student_id, accuracy, float(response_time or 0), accuracy)
+
+
+def bump_progress_version(conn, student_ids):
+    conn.executemany(BUMP_VERSION_SQL, [(sid,) for sid in set(student_ids)])
+
+
+def rollup_params(student_id, topic, accuracy, response_time, timestamp, *_):
+    """Parameters for ROLLUP_UPSERT_SQL from a single progress row."""
+    t = response_time or 0
+    return (
+        student_id,
+        topic,
+        1 if accuracy == 100 else 0,
+        accuracy,
+        t,
+        t * t,
+        timestamp,
+        timestamp
+    )
+
+
+def answer_row(
+    student_id, topic, is_correct, response_time,
+    question_id=None, difficulty=None, subtopic=None
+):
+    """An answer row for write_answers, timestamped now."""
+    answered_at = datetime.now()
+    return (
+        student_id,
+        topic,
+        100 if is_correct else 0,
+        response_time,
+        answered_at.isoformat(),
+        int(answered_at.timestamp()),
+        question_id,
+        difficulty,
+        subtopic
+    )
+
+
+def to_epoch(value):
+    """datetime / ISO string / number -> integer epoch seconds (None passes through)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+# Per-topic rollup rows with per-user totals attached by window aggregates.
+# Mastered topics: topic-wide BKT skills that pass knowledge_tracing.is_mastered
+# (the definition the adaptive engine uses).
+SUMMARY_COLUMNS = f"""
+    topic,
+    attempts,
+    correct,
+    SUM(attempts) OVER (PARTITION BY user_id),
+    SUM(sum_accuracy) OVER (PARTITION BY user_id),
+    (
+        SELECT COUNT(*) FROM knowledge_state k
+        WHERE k.user_id = progress_rollup.user_id AND k.subtopic = ''
+          AND {mastered_sql("k.")}
+    )
+"""
+
+
+def _summary_from_rows(rows):
+    """Build the get_student_progress dict from SUMMARY_COLUMNS rows."""
+    if not rows:
+        return {
+            "topics_completed": 0,
+            "topics_mastered": 0,
+            "total_activities": 0,
+            "overall_score": 0,
+            "average_accuracy": 0,
+            "topic_scores": {}
+        }
+
+    _, _, _, total_attempts, total_accuracy, topics_mastered = rows[0]
+    avg_accuracy = total_accuracy / total_attempts
+
+    topic_scores = {
+        r[0]: {
+            "attempts": r[1],
+            "correct": r[2]
+        }
+        for r in rows
+    }
+
+    return {
+        "topics_completed": len(topic_scores),
+        "topics_mastered": topics_mastered,
+        "total_activities": total_attempts,
+        "overall_score": avg_accuracy,          # used only if needed
+        "average_accuracy": avg_accuracy,       # true accuracy
+        "topic_scores": topic_scores
+    }
+
+
+def _window_clause(student_id, start=None, end=None):
+    """WHERE clause + params for a student's answers in [start, end)."""
+    clause, params = ["user_id = ?"], [student_id]
+    if start is not None:
+        clause.append("ts >= ?")
+        params.append(to_epoch(start))
+    if end is not None:
+        clause.append("ts < ?")
+        params.append(to_epoch(end))
+    return " AND ".join(clause), params
+
+
+def _utc_offset(tz, ts):
+    if tz is None:
+        return int(datetime.fromtimestamp(ts).astimezone().utcoffset().total_seconds())
+    return int(datetime.fromtimestamp(ts, tz).utcoffset().total_seconds())
+
+
+def _offset_sql(tz, lo, hi):
+    """
+    SQL expression (+ params) for the UTC offset of `tz` at each row's ts,
+    for ts in [lo, hi]: a CASE over the constant-offset spans between the
+    zone's transitions, found by a daily scan and a bisection to the second.
+    """
+    if isinstance(tz, str):
+        tz = ZoneInfo(tz)
+
+    spans, offset, t = [], _utc_offset(tz, lo), lo
+    while t < hi:
+        step = min(t + 86400, hi)
+        if _utc_offset(tz, step) != offset:
+            a, b = t, step          # offset changes in (a, b]
+            while b - a > 1:
+                mid = (a + b) // 2
+                if _utc_offset(tz, mid) == offset:
+                    a = mid
+                else:
+                    b = mid
+            spans.append((b, offset))
+            offset = _utc_offset(tz, b)
+            step = b
+        t = step
+
+    if not spans:
+        return "?", [offset]
+    cases = " ".join("WHEN ts < ? THEN ?" for _ in spans)
+    return f"CASE {cases} ELSE ? END", [v for span in spans for v in span] + [offset]
+
+
+_ratings = RatingEngine()
+_knowledge = KnowledgeTracer()
+_reviews = ReviewScheduler()
+_levels = DifficultyState()
+
+
+def write_answers(conn, rows):
+    """
+    Persist answer rows
+    `(user_id, topic, accuracy, response_time, timestamp, ts, question_id, difficulty, subtopic)`
+    and fold them into the rollup, the learner's running state, the Elo
+    ratings, the BKT mastery estimates, the review schedule and the
+    adaptive difficulty level.
+    Caller owns the transaction.
+    """
+    cur = conn.cursor()
+
+    cur.executemany("""
+        INSERT INTO progress (
+            user_id, topic, accuracy, response_time, timestamp, ts,
+            question_id, difficulty, subtopic
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+
+    cur.executemany(ROLLUP_UPSERT_SQL, [rollup_params(*r) for r in rows])
+
+    # Applied in submission order: the EWMA depends on it
+    cur.executemany(STATE_UPSERT_SQL, [state_params(*r) for r in rows])
+    _ratings.apply_answers(conn, rows)
+    _knowledge.apply_answers(conn, rows)
+    _reviews.apply_answers(conn, rows)
+    _levels.apply_answers(conn, rows)
+    bump_progress_version(conn, (r[0] for r in rows))
+
+
+# -----------------------------
+# SHARED WRITE-BEHIND QUEUE
+# -----------------------------
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_answer_writer():
+    """Process-wide background writer for quiz answers (started on first use)."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteBehindQueue(
+                    write_answers,
+                    key_fn=lambda row: row[0],
+                    name="answer-writer"
+                )
+    return _writer
+
+
+_synced = threading.local()
+
+
+def sync_pending(student_id):
+    """
+    Read-your-writes: wait until this student's queued answers are committed.
+    Raises WriteBehindError if any of them could not be written. A no-op
+    inside synced(student_id).
+    """
+    if _writer is not None and student_id not in getattr(_synced, "ids", ()):
+        _writer.wait_for(student_id)
+
+
+@contextmanager
+def synced(student_id):
+    """
+    Sync once, then treat the student as synced for the block, so reads
+    nested in it do not wait again. Enter before checking out a connection
+    or opening a transaction: the writer needs a pooled connection and the
+    write lock to drain the queue.
+    """
+    sync_pending(student_id)
+    ids = getattr(_synced, "ids", frozenset())
+    _synced.ids = ids | {student_id}
+    try:
+        yield
+    finally:
+        _synced.ids = ids
+
+
+@atexit.register
+def shutdown_answer_writer():
+    """Drain queued answers before the interpreter exits."""
+    if _writer is not None:
+        _writer.close()
 
 
 class ProgressTracker:
     """
     SQLite-based progress tracker (v2).
     Mirrors the API of ProgressTracker (JSON version).
+
+    With write_behind=True answers are recorded through the shared
+    group-commit queue; reads for a student first wait for that student's
+    queued answers, so callers always see their own writes.
     """
 
+    def __init__(self, write_behind=False):
+        self.write_behind = write_behind
+
     # -----------------------------
     # STUDENT HANDLING
     # -----------------------------
     def get_or_create_student(self, student_name):
-        conn = get_connection()
-        cur = conn.cursor()
-
-        cur.execute(
-            "SELECT id FROM users WHERE username = ?",
-            (student_name,)
-        )
-        row = cur.fetchone()
+        with transaction() as conn:
+            cur = conn.cursor()
 
-        if row:
-            user_id = row[0]
-        else:
             cur.execute(
-                "INSERT INTO users (username, created_at) VALUES (?, ?)",
-                (student_name, now())
+                "SELECT id FROM users WHERE username = ?",
+                (student_name,)
             )
-            conn.commit()
-            user_id = cur.lastrowid
+            row = cur.fetchone()
+
+            if row:
+                user_id = row[0]
+            else:
+                cur.execute(
+                    "INSERT INTO users (username, created_at) VALUES (?, ?)",
+                    (student_name, now())
+                )
+                user_id = cur.lastrowid
 
-        conn.close()
         return user_id
 
     # -----------------------------
-    # PROGRESS SUMMARY (FIXED)
+    # PROGRESS VERSION
+    # -----------------------------
+    def get_progress_version(self, student_id):
+        """Counter that changes on every answer, reset or preference update."""
+        sync_pending(student_id)
+
+        with connection() as conn:
+            row = conn.execute(
+                "SELECT progress_version FROM learner_state WHERE user_id = ?",
+                (student_id,)
+            ).fetchone()
+
+        return row[0] if row else 0
+
+    # -----------------------------
+    # PROGRESS SUMMARY (SINGLE QUERY)
     # -----------------------------
     def get_student_progress(self, student_id):
-        conn = get_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT topic, accuracy
-            FROM progress
-            WHERE user_id = ?
-        """, (student_id,))
-        rows = cur.fetchall()
-        conn.close()
-
-        if not rows:
-            return {
-                "topics_completed": 0,
-                "topics_mastered": 0,
-                "total_activities": 0,
-                "overall_score": 0,
-                "average_accuracy": 0,
-                "topic_scores": {}
-            }
+        """
+        Whole summary in one round trip: per-topic rows from the rollup, with
+        user-wide totals and mastery count attached by window aggregates.
+        """
+        sync_pending(student_id)
 
-        total_attempts = len(rows)
-        avg_accuracy = sum(r[1] for r in rows) / total_attempts
-
-        topic_scores = {}
-        for topic, accuracy in rows:
-            if topic not in topic_scores:
-                topic_scores[topic] = {
-                    "attempts": 0,
-                    "correct": 0
-                }
-
-            topic_scores[topic]["attempts"] += 1
-            if accuracy == 100:
-                topic_scores[topic]["correct"] += 1
-
-        topics_completed = len(topic_scores)
-        topics_mastered = sum(
-            1 for t in topic_scores.values()
-            if t["correct"] / t["attempts"] >= 0.8
-        )
+        with connection() as conn:
+            cur = conn.cursor()
 
-        return {
-            "topics_completed": topics_completed,
-            "topics_mastered": topics_mastered,
-            "total_activities": total_attempts,
-            "overall_score": avg_accuracy,          # used only if needed
-            "average_accuracy": avg_accuracy,       # true accuracy
-            "topic_scores": topic_scores
-        }
+            cur.execute(f"""
+                SELECT {SUMMARY_COLUMNS}
+                FROM progress_rollup
+                WHERE user_id = ? AND attempts > 0
+            """, (student_id,))
+            rows = cur.fetchall()
+
+        return _summary_from_rows(rows)
+
+    def get_student_progress_many(self, student_ids):
+        """
+        Batched get_student_progress for cohort views.
+        One grouped query per chunk of ids. Returns {student_id: summary}.
+        """
+        ids = list(dict.fromkeys(student_ids))
+        for sid in ids:
+            sync_pending(sid)
+
+        by_user = {sid: [] for sid in ids}
+        with connection() as conn:
+            cur = conn.cursor()
+
+            for chunk in chunked(ids):
+                cur.execute(f"""
+                    SELECT user_id, {SUMMARY_COLUMNS}
+                    FROM progress_rollup
+                    WHERE user_id IN ({placeholders(len(chunk))}) AND attempts > 0
+                """, chunk)
+
+                for user_id, *row in cur.fetchall():
+                    by_user[user_id].append(row)
+
+        return {sid: _summary_from_rows(rows) for sid, rows in by_user.items()}
 
     # -----------------------------
     # RECORD QUIZ RESPONSE
     # -----------------------------
-    def record_quiz_response(self, student_id, topic, is_correct, response_time):
-        conn = get_connection()
-        cur = conn.cursor()
-
-        accuracy = 100 if is_correct else 0
-
-        cur.execute("""
-            INSERT INTO progress (
-                user_id, topic, accuracy, response_time, timestamp
-            ) VALUES (?, ?, ?, ?, ?)
-        """, (
-            student_id,
-            topic,
-            accuracy,
-            response_time,
-            now()
-        ))
-
-        conn.commit()
-        conn.close()
+    def record_quiz_response(
+        self, student_id, topic, is_correct, response_time,
+        question_id=None, difficulty=None, subtopic=None
+    ):
+        row = answer_row(
+            student_id, topic, is_correct, response_time,
+            question_id, difficulty, subtopic
+        )
+
+        if self.write_behind:
+            get_answer_writer().submit(row)
+            return
+
+        # Raw row and rollup commit together
+        with transaction() as conn:
+            write_answers(conn, [row])
 
     # -----------------------------
     # LEARNING HISTORY
     # -----------------------------
     def get_learning_history(self, student_id, limit=None):
-        conn = get_connection()
-        cur = conn.cursor()
-
-        query = """
-            SELECT topic, accuracy, response_time, timestamp
-            FROM progress
-            WHERE user_id = ?
-            ORDER BY timestamp DESC
-        """
-        if limit:
-            query += f" LIMIT {limit}"
-
-        cur.execute(query, (student_id,))
-        rows = cur.fetchall()
-        conn.close()
+        """Newest-first history as dicts. Prefer iter_history for long histories."""
+        sync_pending(student_id)
+
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT topic, accuracy, response_time, timestamp
+                FROM progress
+                WHERE user_id = ?
+                ORDER BY ts DESC, id DESC
+                LIMIT ?
+            """, (student_id, limit or -1))
+            rows = cur.fetchall()
 
         return [
             {
@@ -143,6 +468,64 @@ class ProgressTracker:
             for r in rows
         ]
 
+    # -----------------------------
+    # STREAMED HISTORY (KEYSET PAGINATION)
+    # -----------------------------
+    def iter_history_pages(
+        self,
+        student_id,
+        topic=None,
+        start=None,
+        end=None,
+        page_size=HISTORY_PAGE_SIZE,
+        newest_first=False,
+        as_numpy=False
+    ):
+        """
+        Yield a student's history one page at a time, seeking on (ts, id)
+        rather than OFFSET, so every page costs the same. Pages are lists of
+        HISTORY_COLUMNS tuples, or HISTORY_DTYPE record arrays with
+        as_numpy=True. The connection is returned between pages.
+        """
+        window, params = _window_clause(student_id, start, end)
+        if topic is not None:
+            window += " AND topic = ?"
+            params.append(topic)
+
+        op, order = ("<", "DESC") if newest_first else (">", "ASC")
+        sync_pending(student_id)
+
+        last = None
+        while True:
+            keyset, page_params = "", list(params)
+            if last is not None:
+                keyset = f" AND (ts, id) {op} (?, ?)"
+                page_params.extend(last)
+
+            with connection() as conn:
+                # COALESCE keeps record arrays free of NULLs
+                rows = conn.execute(f"""
+                    SELECT id, ts, topic, accuracy, COALESCE(response_time, 0)
+                    FROM progress
+                    WHERE {window}{keyset}
+                    ORDER BY ts {order}, id {order}
+                    LIMIT ?
+                """, page_params + [page_size]).fetchall()
+
+            if not rows:
+                return
+
+            yield np.array(rows, dtype=HISTORY_DTYPE) if as_numpy else rows
+
+            if len(rows) < page_size:
+                return
+            last = (rows[-1][1], rows[-1][0])
+
+    def iter_history(self, student_id, **filters):
+        """Row-at-a-time view over iter_history_pages (same filters)."""
+        for page in self.iter_history_pages(student_id, **filters):
+            yield from page
+
     # -----------------------------
     # RECENT ACTIVITY
     # -----------------------------
@@ -163,63 +546,204 @@ class ProgressTracker:
 
         return activities
 
+    # -----------------------------
+    # TIME-WINDOW QUERIES
+    # -----------------------------
+    def get_history_between(self, student_id, start=None, end=None):
+        """
+        Answers in [start, end), oldest first. Bounds may be datetimes,
+        ISO strings or epoch seconds; None leaves that side open.
+        """
+        window, params = _window_clause(student_id, start, end)
+        sync_pending(student_id)
+
+        with connection() as conn:
+            cur = conn.cursor()
+
+            cur.execute(f"""
+                SELECT topic, accuracy, response_time, timestamp, ts
+                FROM progress
+                WHERE {window}
+                ORDER BY ts, id
+            """, params)
+
+            rows = cur.fetchall()
+
+        return [
+            {
+                "topic": r[0],
+                "accuracy": r[1],
+                "response_time": r[2],
+                "date": r[3],
+                "ts": r[4]
+            }
+            for r in rows
+        ]
+
+    def get_daily_activity(self, student_id, start=None, end=None, tz=None):
+        """
+        Attempts and mean accuracy per local calendar day, bucketed in SQL.
+        `tz` is an IANA name or tzinfo (the server's zone if None); each
+        answer is shifted by the UTC offset in force at its own time, so
+        days stay right across DST changes.
+        """
+        window, params = _window_clause(student_id, start, end)
+        sync_pending(student_id)
+
+        with connection() as conn:
+            cur = conn.cursor()
+
+            lo, hi = cur.execute(
+                f"SELECT MIN(ts), MAX(ts) FROM progress WHERE {window}", params
+            ).fetchone()
+            if lo is None:
+                return []
+            shift, shift_params = _offset_sql(tz, int(lo), int(hi) + 1)
+
+            cur.execute(f"""
+                SELECT date(ts + {shift}, 'unixepoch') AS day,
+                    COUNT(*),
+                    AVG(accuracy)
+                FROM progress
+                WHERE {window}
+                GROUP BY day
+                ORDER BY day
+            """, shift_params + params)
+
+            rows = cur.fetchall()
+
+        return [
+            {"day": day, "attempts": attempts, "accuracy": accuracy}
+            for day, attempts, accuracy in rows
+        ]
+
     # -----------------------------
     # TOPIC PROGRESS
     # -----------------------------
     def get_topic_progress(self, student_id, topic):
-        conn = get_connection()
-        cur = conn.cursor()
+        sync_pending(student_id)
 
-        cur.execute("""
-            SELECT accuracy, response_time
-            FROM progress
-            WHERE user_id = ? AND topic = ?
-        """, (student_id, topic))
+        with connection() as conn:
+            cur = conn.cursor()
 
-        rows = cur.fetchall()
-        conn.close()
+            cur.execute("""
+                SELECT attempts, correct, sum_time, sum_time_sq
+                FROM progress_rollup
+                WHERE user_id = ? AND topic = ?
+            """, (student_id, topic))
 
-        if not rows:
+            row = cur.fetchone()
+
+        if not row or not row[0]:
             return {
                 "total_questions": 0,
                 "correct_answers": 0,
                 "accuracy": 0,
                 "average_time": 0,
+                "time_std": 0,
                 "attempts": 0
             }
 
-        total = len(rows)
-        correct = sum(1 for r in rows if r[0] == 100)
-        avg_time = sum(r[1] for r in rows) / total
+        total, correct, sum_time, sum_time_sq = row
+        avg_time = sum_time / total
+        time_var = max(0.0, sum_time_sq / total - avg_time ** 2)
 
         return {
             "total_questions": total,
             "correct_answers": correct,
             "accuracy": (correct / total) * 100,
             "average_time": avg_time,
+            "time_std": time_var ** 0.5,
             "attempts": total
         }
 
+    # -----------------------------
+    # ABILITY (ELO RATINGS, BKT MASTERY, DIFFICULTY)
+    # -----------------------------
+    def get_topic_ability(self, student_id, topic):
+        """(rating, answers_seen) for the learner on a topic, or None if unrated."""
+        sync_pending(student_id)
+        return _ratings.get_ability(student_id, topic)
+
+    def get_mastered_skills(self, student_id, topic=None):
+        """{(topic, subtopic)} the learner has mastered ("" subtopic: the whole topic)."""
+        sync_pending(student_id)
+        return _knowledge.get_mastered(student_id, topic)
+
+    def get_topic_difficulty(self, student_id, topic):
+        """Persisted adaptive difficulty for a topic, or None if not derived yet."""
+        sync_pending(student_id)
+        return _levels.get(student_id, topic)
+
+    def set_topic_difficulty(self, student_id, topic, difficulty):
+        _levels.set(student_id, topic, difficulty)
+
+    # -----------------------------
+    # SPACED REPETITION
+    # -----------------------------
+    def get_due_reviews(self, student_id, topic=None, limit=10):
+        """Question ids due for review now, most overdue first."""
+        sync_pending(student_id)
+        return _reviews.due_cards(student_id, topic, limit)
+
+    def get_due_review_counts(self, student_id):
+        """{topic: number of questions due for review now}."""
+        sync_pending(student_id)
+        return _reviews.due_counts(student_id)
+
+    def get_next_review_due(self, student_id):
+        """Epoch time the learner's next review becomes due (None if nothing is scheduled)."""
+        sync_pending(student_id)
+        return _reviews.next_due(student_id)
+
     # -----------------------------
     # RESET PROGRESS
     # -----------------------------
     def reset_student_progress(self, student_id):
-        conn = get_connection()
-        cur = conn.cursor()
+        # Queued answers must land before the delete, not after it
+        sync_pending(student_id)
 
-        cur.execute(
-            "DELETE FROM progress WHERE user_id = ?",
-            (student_id,)
-        )
+        with transaction() as conn:
+            cur = conn.cursor()
 
-        conn.commit()
-        conn.close()
+            cur.execute(
+                "DELETE FROM progress WHERE user_id = ?",
+                (student_id,)
+            )
+            cur.execute(
+                "DELETE FROM progress_rollup WHERE user_id = ?",
+                (student_id,)
+            )
+            cur.execute(
+                "DELETE FROM learner_ability WHERE user_id = ?",
+                (student_id,)
+            )
+            cur.execute(
+                "DELETE FROM knowledge_state WHERE user_id = ?",
+                (student_id,)
+            )
+            cur.execute(
+                "DELETE FROM review_cards WHERE user_id = ?",
+                (student_id,)
+            )
+            cur.execute(
+                "DELETE FROM learner_difficulty WHERE user_id = ?",
+                (student_id,)
+            )
+            cur.execute("""
+                UPDATE learner_state
+                SET n = 0, acc_mean = 0, acc_m2 = 0,
+                    time_mean = 0, time_m2 = 0, ewma_accuracy = 0
+                WHERE user_id = ?
+            """, (student_id,))
+            bump_progress_version(conn, [student_id])
 
     # -----------------------------
     # OVERALL SCORE (SEPARATE FROM ACCURACY)
     # -----------------------------
-    def compute_overall_score(self, student_id):
-        p = self.get_student_progress(student_id)
+    def compute_overall_score(self, student_id, progress=None):
+        """Pass an already fetched `get_student_progress` result to skip the query."""
+        p = progress if progress is not None else self.get_student_progress(student_id)
 
         accuracy = p["average_accuracy"]     # %
         topics = p["topics_completed"]       # count
@@ -237,20 +761,18 @@ class ProgressTracker:
     # ALL TOPIC PROGRESS
     # -----------------------------
     def get_all_topic_progress(self, student_id):
-        conn = get_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT topic,
-                COUNT(*) as attempts,
-                SUM(CASE WHEN accuracy = 100 THEN 1 ELSE 0 END) as correct
-            FROM progress
-            WHERE user_id = ?
-            GROUP BY topic
-        """, (student_id,))
-
-        rows = cur.fetchall()
-        conn.close()
+        sync_pending(student_id)
+
+        with connection() as conn:
+            cur = conn.cursor()
+
+            cur.execute("""
+                SELECT topic, attempts, correct
+                FROM progress_rollup
+                WHERE user_id = ?
+            """, (student_id,))
+
+            rows = cur.fetchall()
 
         topic_progress = {}
 
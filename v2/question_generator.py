@@ -1,168 +1,188 @@
 import random
+import threading
+
 import streamlit as st
 
+from v2.adaptive_testing import MIN_CALIBRATION, CATSession, ItemInformationTable, prior_for
+from v2.bandit import ThompsonSelector
+from v2.question_store import get_question_store
+from v2.rating_engine import DIFFICULTY_PRIORS, RatingEngine
+
+
 class QuestionGenerator:
+    """
+    Question selection over the shared, read-only QuestionStore.
+
+    Holds no per-learner state, so one instance (get_question_generator)
+    serves every session: each draw gets its own option permutation, and
+    the bandit posteriors and CAT tables, which all sessions share and
+    improve together, are guarded by a lock. Both are rebuilt after the
+    bank's content is edited.
+    """
+
     def __init__(self):
-        self.bank = {
-
-            # =========================
-            # 📐 MATH
-            # =========================
-            "Mathematics": {
-                "Easy": [
-                    ("What is 2 + 2?", ["3", "4", "5", "6"], "4"),
-                    ("What is 5 × 1?", ["3", "5", "6", "7"], "5"),
-                    ("What is 10 − 6?", ["2", "3", "4", "5"], "4"),
-                    ("What is 8 + 1?", ["7", "8", "9", "10"], "9"),
-                    ("What is 6 ÷ 2?", ["2", "3", "4", "6"], "3"),
-                ],
-                "Medium": [
-                    ("What is 12 ÷ 3?", ["2", "3", "4", "6"], "4"),
-                    ("What is 15 − 7?", ["6", "7", "8", "9"], "8"),
-                    ("What is 9 × 4?", ["32", "36", "40", "42"], "36"),
-                    ("What is 25 ÷ 5?", ["3", "4", "5", "6"], "5"),
-                    ("What is 7²?", ["14", "49", "21", "28"], "49"),
-                ],
-                "Hard": [
-                    ("Solve: 3² + 4²", ["25", "12", "9", "16"], "25"),
-                    ("What is √144?", ["10", "11", "12", "13"], "12"),
-                    ("Solve: (8 × 5) − 12", ["28", "32", "40", "52"], "28"),
-                    ("What is 2³ × 3?", ["12", "18", "24", "16"], "24"),
-                    ("What is 45 ÷ 9?", ["3", "4", "5", "6"], "5"),
-                ],
-            },
-
-            # =========================
-            # 🔬 SCIENCE
-            # =========================
-            "Science": {
-                "Easy": [
-                    ("Water boils at?", ["50°C", "100°C", "0°C", "150°C"], "100°C"),
-                    ("Which planet is known as Red Planet?", ["Earth", "Mars", "Jupiter", "Venus"], "Mars"),
-                    ("Humans breathe in?", ["Oxygen", "Carbon", "Nitrogen", "Hydrogen"], "Oxygen"),
-                    ("Sun is a?", ["Planet", "Star", "Galaxy", "Asteroid"], "Star"),
-                    ("Plants make food by?", ["Respiration", "Photosynthesis", "Digestion", "Fermentation"], "Photosynthesis"),
-                ],
-                "Medium": [
-                    ("Which gas do plants absorb?", ["Oxygen", "Nitrogen", "CO₂", "Hydrogen"], "CO₂"),
-                    ("What organ pumps blood?", ["Brain", "Lungs", "Heart", "Kidney"], "Heart"),
-                    ("Which vitamin comes from sunlight?", ["A", "B", "C", "D"], "D"),
-                    ("What force pulls objects to Earth?", ["Magnetism", "Gravity", "Friction", "Pressure"], "Gravity"),
-                    ("pH of pure water is?", ["5", "6", "7", "8"], "7"),
-                ],
-                "Hard": [
-                    ("Chemical symbol of Sodium?", ["So", "Na", "Sn", "S"], "Na"),
-                    ("Unit of electric current?", ["Volt", "Ohm", "Ampere", "Watt"], "Ampere"),
-                    ("Which blood cells fight infection?", ["RBC", "WBC", "Platelets", "Plasma"], "WBC"),
-                    ("Speed of light is approx?", ["3×10⁸ m/s", "3×10⁶ m/s", "3×10⁴ m/s", "300 m/s"], "3×10⁸ m/s"),
-                    ("Main gas in Earth’s atmosphere?", ["Oxygen", "Carbon Dioxide", "Nitrogen", "Hydrogen"], "Nitrogen"),
-                ],
-            },
-
-            # =========================
-            # 💻 PROGRAMMING
-            # =========================
-            "Programming": {
-                "Easy": [
-                    ("Which keyword defines a function in Python?", ["func", "define", "def", "lambda"], "def"),
-                    ("Which symbol is used for comments in Python?", ["//", "#", "/*", "--"], "#"),
-                    ("What data type is 10?", ["String", "Float", "Integer", "Boolean"], "Integer"),
-                    ("Which function prints output?", ["print()", "show()", "echo()", "output()"], "print()"),
-                    ("Which operator adds values?", ["*", "-", "+", "/"], "+"),
-                ],
-                "Medium": [
-                    ("What does len([1,2,3]) return?", ["2", "3", "Error", "None"], "3"),
-                    ("Which loop repeats a block?", ["if", "for", "break", "return"], "for"),
-                    ("What is index of first element?", ["0", "1", "-1", "None"], "0"),
-                    ("Which keyword stops a loop?", ["stop", "exit", "break", "end"], "break"),
-                    ("Which structure stores key-value pairs?", ["List", "Tuple", "Set", "Dictionary"], "Dictionary"),
-                ],
-                "Hard": [
-                    ("Output of bool([])?", ["True", "False", "None", "Error"], "False"),
-                    ("What is returned by type(5)?", ["int", "Integer", "<class 'int'>", "number"], "<class 'int'>"),
-                    ("Which is immutable?", ["List", "Set", "Dictionary", "Tuple"], "Tuple"),
-                    ("What does pass do?", ["Stops program", "Skips block", "Throws error", "Ends loop"], "Skips block"),
-                    ("Result of 5 // 2?", ["2.5", "2", "3", "Error"], "2"),
-                ],
-            },
-
-            # =========================
-            # 🗣️ LANGUAGES
-            # =========================
-            "Languages": {
-                "Easy": [
-                    ("Plural of 'child'?", ["childs", "children", "childes", "child"], "children"),
-                    ("Opposite of 'hot'?", ["Cold", "Warm", "Cool", "Heat"], "Cold"),
-                    ("Synonym of 'big'?", ["Large", "Small", "Tiny", "Little"], "Large"),
-                    ("Correct article: ___ apple", ["a", "an", "the", "no article"], "an"),
-                    ("Past tense of 'go'?", ["goed", "went", "gone", "goes"], "went"),
-                ],
-                "Medium": [
-                    ("Synonym of 'quick'?", ["slow", "fast", "lazy", "late"], "fast"),
-                    ("Antonym of 'happy'?", ["joyful", "sad", "excited", "glad"], "sad"),
-                    ("Which is a noun?", ["run", "beautiful", "book", "quickly"], "book"),
-                    ("Correct spelling?", ["recieve", "receive", "receeve", "receve"], "receive"),
-                    ("Plural of 'mouse'?", ["mouses", "mouse", "mice", "meese"], "mice"),
-                ],
-                "Hard": [
-                    ("Correct spelling?", ["accomodate", "accommodate", "acommodate", "acomodate"], "accommodate"),
-                    ("Which is an adverb?", ["quick", "quickly", "quickness", "quicken"], "quickly"),
-                    ("Choose correct sentence", [
-                        "He don’t like it",
-                        "He doesn’t like it",
-                        "He didn’t likes it",
-                        "He not like it"
-                    ], "He doesn’t like it"),
-                    ("Meaning of 'ubiquitous'?", [
-                        "Rare",
-                        "Everywhere",
-                        "Dangerous",
-                        "Unknown"
-                    ], "Everywhere"),
-                    ("Which is a conjunction?", ["and", "very", "quick", "blue"], "and"),
-                ],
-            },
-        }
+        # Shared, indexed question bank (see v2.question_store)
+        self.store = get_question_store()
+        self._lock = threading.Lock()
+        self._build()
 
-    def generate_question(self, topic, difficulty):
-        # 🔐 SAFETY FALLBACKS
-        topic_data = self.bank.get(topic, {})
-        pool = topic_data.get(difficulty, [])
+    def _build(self):
+        # One Thompson-sampling pool per (topic, difficulty), in store order
+        self.version = self.store.version
+        self.selector = ThompsonSelector()
+        for topic in self.store.topics:
+            for difficulty in self.store.difficulties(topic):
+                self.selector.add_pool((topic, difficulty), self.store.ids(topic, difficulty))
+        self.selector.load_posteriors()
 
-        # 🚑 IF EMPTY → FALLBACK TO EASY
-        if not pool:
-            pool = topic_data.get("Easy", [])
+        # Per-topic CAT information tables, built on first use
+        self.cat_tables = {}
 
-        # 🚑 STILL EMPTY → GLOBAL FALLBACK
-        if not pool:
-            return {
-                "question": "Fallback question: 1 + 1 = ?",
-                "options": ["1", "2", "3", "4"],
-                "correct_answer": "2",
-            }
+    def _sync(self):
+        """Rebuild pools and tables if the bank was edited since, here or in another process (caller holds the lock)."""
+        self.store.refresh()
+        if self.version != self.store.version:
+            self._build()
 
-        q, options, correct = random.choice(pool)
-        if st.session_state.get("shuffle_options", True):
-            random.shuffle(options)
+    def generate_question(self, topic, difficulty, exclude=(), sampler=None):
+        """
+        Bandit-selected question; ids in `exclude` (already asked) are avoided.
+        With a QuizSampler the draw is O(1) and never repeats within the quiz;
+        a pool that has run dry falls back to the nearest difficulty that
+        still has unseen questions.
+        """
+        if sampler is not None:
+            for level in self._levels_near(topic, difficulty):
+                with self._lock:
+                    self._sync()
+                    qid = sampler.draw((topic, level), self.store.ids(topic, level), self.selector.choose)
+                if qid is not None:
+                    return self._as_question(qid)
+            # Whole topic seen: repeats are unavoidable, pick by bandit alone
+            exclude = sampler.asked
 
-        return {
-            "question": q,
-            "options": options,
-            "correct_answer": correct,
-        }
+        with self._lock:
+            self._sync()
+
+            # 🔐 SAFETY FALLBACKS
+            pool = self.store.ids(topic, difficulty)
+
+            # 🚑 IF EMPTY → FALLBACK TO EASY
+            if not len(pool):
+                difficulty = "Easy"
+                pool = self.store.ids(topic, difficulty)
+
+            # 🚑 STILL EMPTY → GLOBAL FALLBACK
+            if not len(pool):
+                return {
+                    "question": "Fallback question: 1 + 1 = ?",
+                    "options": ["1", "2", "3", "4"],
+                    "correct_answer": "2",
+                }
+
+            # Pool and selector read under one lock, so an edit can't land between them
+            pos = self.selector.select((topic, difficulty), exclude)
+        return self._as_question(int(pool[pos]))
 
-    def generate_ai_question(self, topic, difficulty):
+    def _levels_near(self, topic, difficulty):
+        """The topic's difficulty levels, closest to `difficulty` first."""
+        target = DIFFICULTY_PRIORS.get(difficulty, DIFFICULTY_PRIORS["Easy"])
+        return sorted(
+            self.store.difficulties(topic),
+            key=lambda level: abs(DIFFICULTY_PRIORS.get(level, 0.0) - target)
+        )
+
+    # -------------------------
+    # COMPUTERIZED ADAPTIVE TESTING
+    # -------------------------
+    def cat_table(self, topic):
+        """Information table over every difficulty of a topic (calibrated where possible)."""
+        with self._lock:
+            self._sync()
+            return self._cat_table(topic)
+
+    def _cat_table(self, topic):
+        if topic not in self.cat_tables:
+            # Labels from the per-difficulty indexes; no question rows are read
+            ids, labels = [], []
+            for difficulty in self.store.difficulties(topic):
+                level_ids = self.store.ids(topic, difficulty).tolist()
+                ids.extend(level_ids)
+                labels.extend([difficulty] * len(level_ids))
+
+            calibrated = RatingEngine().get_item_difficulties(ids)
+            difficulties = [
+                calibrated[qid][0]
+                if calibrated.get(qid, (0, 0))[1] >= MIN_CALIBRATION
+                else DIFFICULTY_PRIORS.get(label, 0.0)
+                for qid, label in zip(ids, labels)
+            ]
+            self.cat_tables[topic] = ItemInformationTable(ids, difficulties)
+        return self.cat_tables[topic]
+
+    def start_cat(self, topic, ability=None):
+        """New CAT session; `ability` is the learner's Elo (rating, n) on the topic, if any."""
+        mean, sd = prior_for(ability)
+        return CATSession(self.cat_table(topic), prior_mean=mean, prior_sd=sd)
+
+    def generate_cat_question(self, session):
+        """Most informative next question for a CAT session, or None when the test is over."""
+        qid = session.next_item()
+        if qid is None:
+            return None
+        return self._as_question(qid)
+
+    def record_answer(self, question_id, correct):
+        """Update the selector's posterior for an answered question."""
+        with self._lock:
+            self.selector.update(question_id, correct)
+
+    def generate_review_question(self, question_ids, exclude=()):
+        """First of `question_ids` (due reviews) that is in the store and not in `exclude`, or None."""
+        for qid in question_ids:
+            if qid in self.store and qid not in exclude:
+                return dict(self._as_question(qid), review=True)
+        return None
+
+    def _as_question(self, qid):
+        # Per-draw permutation of option indexes; the stored options never move
+        order = None
+        if st.session_state.get("shuffle_options", True):
+            n = len(self.store.get(qid).options)
+            order = random.sample(range(n), n)
+        return self.store.as_dict(qid, order)
+
+    def generate_ai_question(self, topic, difficulty, exclude=(), sampler=None):
         """
         Simulated AI-generated question.
         (Mentor-safe placeholder for future LLM integration)
         """
 
-        base_question = self.generate_question(topic, difficulty)
+        base_question = self.generate_question(topic, difficulty, exclude, sampler)
 
         return {
             "question": f"[AI Generated] {base_question['question']}",
             "options": base_question["options"],
             "correct_answer": base_question["correct_answer"],
+            "question_id": base_question.get("question_id"),
+            "difficulty": base_question.get("difficulty"),
+            "subtopic": base_question.get("subtopic"),
             "ai_generated": True
         }
-    
\ No newline at end of file
+
+
+# -----------------------------
+# SHARED GENERATOR
+# -----------------------------
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_question_generator():
+    """Process-wide QuestionGenerator (one bank, one bandit for every session)."""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = QuestionGenerator()
+    return _generator
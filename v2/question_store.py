@@ -0,0 +1,538 @@
+"""
+Disk-backed question bank shared by ContentManager and QuestionGenerator.
+
+The bank lives in its own SQLite file (QUESTION_DB), built from
+question_bank.json plus any custom content (snapshot + edit journal, see
+v2.content_journal) and rebuilt only when those files change; edits made
+through apply() update it in place. Questions are indexed by (topic, difficulty, subtopic) and
+full-text searchable (FTS5 on question text and explanation); rows are
+read only when a quiz needs them.
+
+Usage:
+    python -m v2.question_store [--db PATH] [--rebuild] [--search TEXT]
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from v2.content_journal import get_content_journal, journal_path
+from v2.database import chunked, get_pool, placeholders
+
+# Base question bank (flat list of records), shipped next to content_graph.json
+BANK_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "question_bank.json"
+)
+
+# Custom content snapshot (topic -> subtopic -> list); edits since the last
+# compaction are in its journal (content_data.journal)
+CUSTOM_CONTENT_FILE = "content_data.json"
+
+# Built bank; derived from the files above
+QUESTION_DB = "question_bank.db"
+SCHEMA_VERSION = 1
+
+ROW_CACHE_SIZE = 4096       # decoded questions kept in memory per process
+SEARCH_LIMIT = 20
+PAGE_SIZE = 50
+
+QUESTION_COLUMNS = "id, topic, subtopic, difficulty, question, options, correct_answer, explanation"
+
+
+def question_id(topic, text):
+    """Stable 63-bit id for a question (same across restarts and processes)."""
+    digest = hashlib.blake2b(f"{topic}\x1f{text}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+Question = namedtuple(
+    "Question",
+    "id topic subtopic difficulty text options correct_answer explanation"
+)
+
+
+# -------------------------
+# BUILD
+# -------------------------
+def load_records(bank_file=BANK_FILE, custom_file=CUSTOM_CONTENT_FILE):
+    """Base bank records followed by the custom content (snapshot + journal replayed)."""
+    with open(bank_file, "r", encoding="utf-8") as f:
+        records = json.load(f)
+
+    if custom_file:
+        custom, deleted = get_content_journal(custom_file).load()
+        if deleted:
+            records = [r for r in records if (r["topic"], r["question"]) not in deleted]
+        records += custom
+
+    return records
+
+
+def bank_sources(bank_file=BANK_FILE, custom_file=CUSTOM_CONTENT_FILE):
+    """Files the bank is built from."""
+    return (bank_file, custom_file, journal_path(custom_file)) if custom_file else (bank_file,)
+
+
+def source_stamp(*paths):
+    """Identifies the current contents of the bank's source files."""
+    stamp = []
+    for path in paths:
+        if path and os.path.exists(path):
+            st = os.stat(path)
+            stamp.append([path, st.st_mtime_ns, st.st_size])
+    return json.dumps(stamp)
+
+
+def _row(qid, seq, r):
+    return (
+        qid,
+        seq,
+        r["topic"],
+        r.get("subtopic") or "",
+        r.get("difficulty") or "Medium",
+        r["question"],
+        json.dumps(list(r["options"]), ensure_ascii=False),
+        r["correct_answer"],
+        r.get("explanation", ""),
+    )
+
+
+def build_bank(db_name, records, stamp=""):
+    """
+    (Re)create the bank in `db_name` from records. Later records replace
+    earlier ones with the same id (custom content over the base bank).
+    """
+    rows = {}
+    for seq, r in enumerate(records):
+        qid = question_id(r["topic"], r["question"])
+        rows.pop(qid, None)
+        rows[qid] = _row(qid, seq, r)
+
+    with get_pool(db_name).transaction() as conn:
+        conn.execute("DROP TABLE IF EXISTS questions_fts")
+        conn.execute("DROP TABLE IF EXISTS questions")
+        conn.execute("""
+        CREATE TABLE questions (
+            id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            topic TEXT NOT NULL,
+            subtopic TEXT NOT NULL DEFAULT '',
+            difficulty TEXT NOT NULL,
+            question TEXT NOT NULL,
+            options TEXT NOT NULL,
+            correct_answer TEXT NOT NULL,
+            explanation TEXT NOT NULL DEFAULT ''
+        )
+        """)
+        conn.execute("""
+        CREATE INDEX idx_questions_level
+        ON questions(topic, difficulty, subtopic, seq)
+        """)
+        conn.execute("""
+        CREATE VIRTUAL TABLE questions_fts USING fts5(
+            question, explanation, content='questions', content_rowid='id'
+        )
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS bank_meta (key TEXT PRIMARY KEY, value TEXT)
+        """)
+
+        conn.executemany(f"""
+            INSERT INTO questions (id, seq, topic, subtopic, difficulty, question,
+                                   options, correct_answer, explanation)
+            VALUES ({placeholders(9)})
+        """, rows.values())
+        conn.execute("INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')")
+
+        _set_stamp(conn, stamp)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    return len(rows)
+
+
+def _set_stamp(conn, stamp):
+    conn.execute(
+        "INSERT OR REPLACE INTO bank_meta (key, value) VALUES ('source', ?)", (stamp,)
+    )
+
+
+def _get_stamp(conn):
+    row = conn.execute("SELECT value FROM bank_meta WHERE key = 'source'").fetchone()
+    return row[0] if row else None
+
+
+def built_stamp(db_name):
+    """Source stamp the bank in `db_name` was built from (None if not built)."""
+    with get_pool(db_name).connection() as conn:
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            return None
+        return _get_stamp(conn)
+
+
+def ensure_bank(db_name=QUESTION_DB, bank_file=BANK_FILE, custom_file=CUSTOM_CONTENT_FILE):
+    """Build the bank database, or rebuild it if its source files changed."""
+    stamp = source_stamp(*bank_sources(bank_file, custom_file))
+    if built_stamp(db_name) != stamp:
+        build_bank(db_name, load_records(bank_file, custom_file), stamp)
+
+
+# -------------------------
+# STORE
+# -------------------------
+class QuestionStore:
+    """
+    View of a built bank database.
+
+    Only what selection needs stays resident: per (topic, difficulty,
+    subtopic) arrays of question ids, with None as a wildcard, read from the
+    covering index the first time each combination is asked for. Question
+    rows are fetched by id on demand and kept in a bounded LRU, so memory
+    follows what quizzes actually touch, not the size of the bank.
+
+    Content edits go through apply(), which updates only the rows they
+    touch; `version` counts them so holders of derived state (the bandit
+    pools) know to refresh. Edits made by other processes are picked up by
+    refresh(), which compares the bank's stored source stamp with the one
+    this store last loaded.
+    """
+
+    def __init__(self, db_name=QUESTION_DB, cache_size=ROW_CACHE_SIZE):
+        self.pool = get_pool(db_name)
+        self.cache_size = cache_size
+        self.version = 0
+        self._rows = OrderedDict()
+        self._ids = {}
+        self._lock = threading.Lock()
+
+        with self.pool.transaction() as conn:
+            self._load_levels(conn)
+
+    def _load_levels(self, conn):
+        """Topics, difficulty levels, count and stamp as of `conn`'s snapshot (caller holds the lock, if shared)."""
+        levels = conn.execute("""
+            SELECT topic, difficulty, MIN(seq) AS first, COUNT(*)
+            FROM questions
+            GROUP BY topic, difficulty
+            ORDER BY first
+        """).fetchall()
+
+        difficulties = {}
+        for topic, difficulty, _, _ in levels:
+            difficulties.setdefault(topic, []).append(difficulty)
+        self.topics = tuple(difficulties)
+        self._difficulties = {topic: tuple(d) for topic, d in difficulties.items()}
+        self._count = sum(r[3] for r in levels)
+        self._stamp = _get_stamp(conn)
+
+    def refresh(self):
+        """
+        Reload if another process edited or rebuilt the bank since this
+        store last loaded it: one primary-key read when nothing changed.
+        Returns True if the caches were dropped (and `version` bumped).
+        """
+        with self.pool.connection() as conn:
+            if _get_stamp(conn) == self._stamp:
+                return False
+
+        with self._lock, self.pool.transaction() as conn:
+            if _get_stamp(conn) == self._stamp:
+                return False
+            self._load_levels(conn)
+            self._rows.clear()
+            self._ids.clear()
+            self.version += 1
+        return True
+
+    # -------------------------
+    # LOOKUPS
+    # -------------------------
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, qid):
+        return self.get(qid) is not None
+
+    def ids(self, topic, difficulty=None, subtopic=None):
+        """Read-only id array for a topic, optionally narrowed by difficulty and/or subtopic."""
+        key = (topic, difficulty, subtopic)
+        ids = self._ids.get(key)
+        if ids is None:
+            clause, params = ["topic = ?"], [topic]
+            if difficulty is not None:
+                clause.append("difficulty = ?")
+                params.append(difficulty)
+            if subtopic is not None:
+                clause.append("subtopic = ?")
+                params.append(subtopic)
+
+            with self.pool.connection() as conn:
+                rows = conn.execute(f"""
+                    SELECT id FROM questions
+                    WHERE {" AND ".join(clause)}
+                    ORDER BY seq
+                """, params).fetchall()
+
+            ids = np.array([r[0] for r in rows], dtype=np.int64)
+            ids.setflags(write=False)
+            with self._lock:
+                ids = self._ids.setdefault(key, ids)
+        return ids
+
+    def difficulties(self, topic):
+        return self._difficulties.get(topic, ())
+
+    def get(self, qid):
+        """Question tuple for an id, or None."""
+        with self._lock:
+            q = self._rows.get(qid)
+            if q is not None:
+                self._rows.move_to_end(qid)
+                return q
+        return self.get_many([qid]).get(qid)
+
+    def get_many(self, qids):
+        """{id: Question} for the ids that exist; one query per chunk of cache misses."""
+        found, missing = {}, []
+        with self._lock:
+            for qid in qids:
+                q = self._rows.get(qid)
+                if q is None:
+                    missing.append(qid)
+                else:
+                    found[qid] = q
+
+        for chunk in chunked(missing):
+            with self.pool.connection() as conn:
+                rows = conn.execute(f"""
+                    SELECT {QUESTION_COLUMNS} FROM questions
+                    WHERE id IN ({placeholders(len(chunk))})
+                """, chunk).fetchall()
+            for row in rows:
+                found[row[0]] = self._remember(_question(row))
+        return found
+
+    def _remember(self, q):
+        with self._lock:
+            self._rows[q.id] = q
+            self._rows.move_to_end(q.id)
+            while len(self._rows) > self.cache_size:
+                self._rows.popitem(last=False)
+        return q
+
+    def as_dict(self, qid, order=None):
+        """
+        Quiz-facing dict for a question (a fresh copy the caller may modify).
+        `order` is an optional permutation of the option indexes for this draw.
+        """
+        q = self.get(qid)
+        if q is None:
+            raise KeyError(qid)
+        return _as_dict(q, order)
+
+    def as_dicts(self, qids):
+        """as_dict for many ids at once (one query for the cache misses); unknown ids are skipped."""
+        found = self.get_many(qids)
+        return [_as_dict(found[qid]) for qid in qids if qid in found]
+
+    # -------------------------
+    # AUTHORING: EDITS
+    # -------------------------
+    def apply(self, ops, stamp=None):
+        """
+        Apply journal entries (v2.content_journal put_op / delete_op) to the
+        bank in one transaction: O(edits), not O(bank). `stamp` records the
+        source files the bank now matches, so the next start does not rebuild.
+        """
+        touched, added, levels = set(), 0, []
+        with self.pool.transaction() as conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), -1) FROM questions").fetchone()[0]
+            for op in ops:
+                qid = question_id(op["topic"], op["question"])
+                old = conn.execute(
+                    "SELECT question, explanation FROM questions WHERE id = ?", (qid,)
+                ).fetchone()
+                if old is not None:
+                    conn.execute("""
+                        INSERT INTO questions_fts (questions_fts, rowid, question, explanation)
+                        VALUES ('delete', ?, ?, ?)
+                    """, (qid, *old))
+                    conn.execute("DELETE FROM questions WHERE id = ?", (qid,))
+                    added -= 1
+
+                if op["op"] == "put":
+                    seq += 1
+                    row = _row(qid, seq, op)
+                    conn.execute(f"""
+                        INSERT INTO questions (id, seq, topic, subtopic, difficulty, question,
+                                               options, correct_answer, explanation)
+                        VALUES ({placeholders(9)})
+                    """, row)
+                    conn.execute("""
+                        INSERT INTO questions_fts (rowid, question, explanation)
+                        VALUES (?, ?, ?)
+                    """, (qid, row[5], row[8]))
+                    added += 1
+                    levels.append((row[2], row[4]))
+
+                touched.add((qid, op["topic"]))
+
+            if stamp is not None:
+                _set_stamp(conn, stamp)
+
+        # Caches change only once the edit is committed, and under the lock
+        topics = {topic for _, topic in touched}
+        with self._lock:
+            if stamp is None or stamp != self._stamp:
+                self._count += added
+                for topic, difficulty in levels:
+                    self._add_level(topic, difficulty)
+                if stamp is not None:
+                    self._stamp = stamp
+            for qid, _ in touched:
+                self._rows.pop(qid, None)
+            for key in [k for k in self._ids if k[0] in topics]:
+                del self._ids[key]
+            self.version += 1
+
+    def mark_built(self, stamp):
+        """Record that the bank matches the source files as of `stamp`."""
+        with self._lock, self.pool.transaction() as conn:
+            _set_stamp(conn, stamp)
+            self._stamp = stamp
+
+    def _add_level(self, topic, difficulty):
+        levels = self._difficulties.get(topic, ())
+        if difficulty not in levels:
+            self._difficulties[topic] = levels + (difficulty,)
+        if topic not in self.topics:
+            self.topics += (topic,)
+
+    # -------------------------
+    # AUTHORING: SEARCH AND PAGING
+    # -------------------------
+    def search(self, text, topic=None, limit=SEARCH_LIMIT, offset=0):
+        """Best full-text matches on question text and explanation, as question dicts."""
+        # Every word must match; quoting keeps FTS5 operators in user input literal
+        terms = " ".join('"' + t.replace('"', '""') + '"' for t in text.split())
+        if not terms:
+            return []
+
+        clause, params = "questions_fts MATCH ?", [terms]
+        if topic is not None:
+            clause += " AND q.topic = ?"
+            params.append(topic)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT q.id, q.topic, q.subtopic, q.difficulty, q.question,
+                       q.options, q.correct_answer, q.explanation
+                FROM questions_fts
+                JOIN questions q ON q.id = questions_fts.rowid
+                WHERE {clause}
+                ORDER BY bm25(questions_fts)
+                LIMIT ? OFFSET ?
+            """, params + [limit, offset]).fetchall()
+        return [_as_dict(_question(r)) for r in rows]
+
+    def page(self, topic=None, difficulty=None, subtopic=None, after=None, limit=PAGE_SIZE):
+        """
+        One page of questions in bank order. Returns (question dicts, cursor);
+        pass the cursor as `after` for the next page (None when done).
+        """
+        clause, params = ["seq > ?"], [after if after is not None else -1]
+        for column, value in (("topic", topic), ("difficulty", difficulty), ("subtopic", subtopic)):
+            if value is not None:
+                clause.append(f"{column} = ?")
+                params.append(value)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT seq, {QUESTION_COLUMNS} FROM questions
+                WHERE {" AND ".join(clause)}
+                ORDER BY seq
+                LIMIT ?
+            """, params + [limit]).fetchall()
+
+        cursor = rows[-1][0] if len(rows) == limit else None
+        return [_as_dict(_question(r[1:])) for r in rows], cursor
+
+    def to_nested(self):
+        """{topic: {subtopic: [question dicts]}}, the content_data.json layout."""
+        nested = {}
+        with self.pool.connection() as conn:
+            for row in conn.execute(f"SELECT {QUESTION_COLUMNS} FROM questions ORDER BY seq"):
+                q = _question(row)
+                nested.setdefault(q.topic, {}).setdefault(q.subtopic, []).append({
+                    "question": q.text,
+                    "options": list(q.options),
+                    "correct_answer": q.correct_answer,
+                    "difficulty": q.difficulty,
+                    "explanation": q.explanation,
+                })
+        return nested
+
+
+def _question(row):
+    qid, topic, subtopic, difficulty, text, options, correct, explanation = row
+    return Question(
+        qid, topic, subtopic, difficulty, text, tuple(json.loads(options)), correct, explanation
+    )
+
+
+def _as_dict(q, order=None):
+    return {
+        "question": q.text,
+        "options": list(q.options) if order is None else [q.options[i] for i in order],
+        "correct_answer": q.correct_answer,
+        "difficulty": q.difficulty,
+        "explanation": q.explanation,
+        "subtopic": q.subtopic or None,
+        "question_id": q.id,
+    }
+
+
+# -----------------------------
+# SHARED STORE
+# -----------------------------
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_question_store():
+    """Process-wide question store; builds or refreshes the bank file on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                ensure_bank()
+                _store = QuestionStore()
+    return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and search the question bank database.")
+    parser.add_argument("--db", default=QUESTION_DB, help="question bank SQLite file")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="rebuild even if the source files are unchanged")
+    parser.add_argument("--search", help="print the best full-text matches for TEXT")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        count = build_bank(args.db, load_records(), source_stamp(*bank_sources()))
+        print(f"built {count} questions into {args.db}")
+    else:
+        ensure_bank(args.db)
+
+    store = QuestionStore(args.db)
+    print(f"{len(store)} questions; topics: {', '.join(store.topics)}")
+    if args.search:
+        for q in store.search(args.search):
+            print(f"[{q['difficulty']}] {q['question']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import random
+
+# Candidates the caller (e.g. the bandit) chooses between on each draw
+WINDOW = 8
+
+
+class QuizSampler:
+    """
+    Per-quiz question draws without replacement.
+
+    Every pool (e.g. topic x difficulty) is walked in a lazily shuffled
+    order: one sparse Fisher-Yates step per question taken, so a draw is
+    O(1) however large the pool. The next WINDOW unseen ids form the
+    candidates a chooser (the Thompson bandit) picks from; the others wait
+    for later draws. Ids handed out from any pool, or marked as asked
+    (reviews, CAT items), are never offered again, and each pool keeps its
+    position when the quiz moves to another difficulty and back.
+
+    Only the seed, per-pool cursors, windows and asked ids are kept in the
+    pickled state; the permutations are rebuilt by replaying the seeded
+    RNG on first use.
+    """
+
+    def __init__(self, asked=(), seed=None, window=WINDOW):
+        self.seed = seed if seed is not None else random.getrandbits(63)
+        self.window = window
+        self.asked = set(asked)
+        self.cursors = {}     # pool key -> permutation positions consumed
+        self.windows = {}     # pool key -> unseen candidate ids, in permutation order
+        self._perms = {}      # pool key -> (rng, sparse swaps), derived
+
+    def __getstate__(self):
+        return {
+            "seed": self.seed,
+            "window": self.window,
+            "asked": list(self.asked),
+            "cursors": self.cursors,
+            "windows": self.windows,
+        }
+
+    def __setstate__(self, state):
+        self.seed = state["seed"]
+        self.window = state["window"]
+        self.asked = set(state["asked"])
+        self.cursors = state["cursors"]
+        self.windows = state["windows"]
+        self._perms = {}
+
+    # -------------------------
+    # DRAWS
+    # -------------------------
+    def draw(self, key, ids, choose=None):
+        """
+        Take one unseen id from pool `key` (its ids, in a fixed order), or
+        None when the pool has run dry. `choose(candidates)` returns the
+        index to take; by default the first (a uniform draw).
+        """
+        candidates = [q for q in self.windows.get(key, ()) if q not in self.asked]
+        while len(candidates) < self.window:
+            qid = self._advance(key, ids)
+            if qid is None:
+                break
+            candidates.append(qid)
+        self.windows[key] = candidates
+
+        if not candidates:
+            return None
+        qid = candidates.pop(choose(candidates) if choose else 0)
+        self.asked.add(qid)
+        return qid
+
+    def mark(self, question_id):
+        """Record a question given outside draw() (a review, a CAT item)."""
+        self.asked.add(question_id)
+
+    def remaining(self, key, ids):
+        """Upper bound on the unseen ids left in pool `key`."""
+        return len(ids) - self.cursors.get(key, 0) + len(self.windows.get(key, ()))
+
+    # -------------------------
+    # LAZY PERMUTATION
+    # -------------------------
+    def _perm(self, key, n):
+        perm = self._perms.get(key)
+        if perm is None:
+            rng = random.Random(f"{self.seed}\x1f{key}")
+            swaps = {}
+            for i in range(self.cursors.get(key, 0)):
+                self._step(rng, swaps, i, n)
+            perm = self._perms[key] = (rng, swaps)
+        return perm
+
+    @staticmethod
+    def _step(rng, swaps, i, n):
+        """Fisher-Yates step i over a virtual array; returns the position placed at i."""
+        j = rng.randrange(i, n)
+        picked = swaps.get(j, j)
+        if j != i:
+            swaps[j] = swaps.get(i, i)
+        swaps.pop(i, None)
+        return picked
+
+    def _advance(self, key, ids):
+        """Next id of the pool's permutation that has not been asked, or None."""
+        n = len(ids)
+        rng, swaps = self._perm(key, n)
+        cursor = self.cursors.get(key, 0)
+
+        while cursor < n:
+            qid = int(ids[self._step(rng, swaps, cursor, n)])
+            cursor += 1
+            if qid not in self.asked:
+                self.cursors[key] = cursor
+                return qid
+
+        self.cursors[key] = cursor
+        return None
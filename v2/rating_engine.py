@@ -0,0 +1,129 @@
+import math
+
+from v2.database import chunked, connection, placeholders
+
+# -------------------------
+# MODEL PARAMETERS
+# -------------------------
+# 1PL / Elo: P(correct) = sigmoid(ability - difficulty), both on a logit scale.
+# Step size shrinks with the number of answers seen: K(n) = ALPHA / (1 + BETA * n)
+ALPHA = 1.0
+BETA = 0.05
+
+# Starting difficulty of a question, by its authored label
+DIFFICULTY_PRIORS = {"Easy": -1.0, "Medium": 0.0, "Hard": 1.0}
+
+# Pick the band whose expected success rate is closest to this
+TARGET_SUCCESS = 0.7
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + math.exp(-x))
+
+
+def step_size(n):
+    return ALPHA / (1.0 + BETA * n)
+
+
+class RatingEngine:
+    """
+    Elo-style rating engine: one ability per (learner, topic) and one
+    difficulty per question, both updated in O(1) per answer and stored in
+    two small keyed tables (learner_ability, item_difficulty).
+    """
+
+    # -------------------------
+    # WRITE PATH
+    # -------------------------
+    def apply_answers(self, conn, rows):
+        """
+        Update ratings for answer rows
+        `(user_id, topic, accuracy, response_time, timestamp, ts, question_id, difficulty, ...)`
+        in order. Caller owns the transaction.
+        """
+        cur = conn.cursor()
+        abilities, items = {}, {}
+
+        for user_id, topic, accuracy, _, _, _, question_id, label, *_ in rows:
+            key = (user_id, topic)
+            if key not in abilities:
+                cur.execute("""
+                    SELECT rating, n FROM learner_ability
+                    WHERE user_id = ? AND topic = ?
+                """, key)
+                abilities[key] = list(cur.fetchone() or (0.0, 0))
+
+            prior = DIFFICULTY_PRIORS.get(label, 0.0)
+            item = None
+            if question_id is not None:
+                if question_id not in items:
+                    cur.execute("""
+                        SELECT rating, n, correct FROM item_difficulty
+                        WHERE question_id = ?
+                    """, (question_id,))
+                    rating, n, correct = cur.fetchone() or (prior, 0, 0)
+                    items[question_id] = [rating, n, correct, topic, label]
+                item = items[question_id]
+
+            ability = abilities[key]
+            difficulty = item[0] if item else prior
+            outcome = 1 if accuracy == 100 else 0
+            surprise = outcome - self.expected_success(ability[0], difficulty)
+
+            ability[0] += step_size(ability[1]) * surprise
+            ability[1] += 1
+            if item:
+                item[0] -= step_size(item[1]) * surprise
+                item[1] += 1
+                item[2] += outcome
+
+        cur.executemany("""
+            INSERT OR REPLACE INTO learner_ability (user_id, topic, rating, n)
+            VALUES (?, ?, ?, ?)
+        """, [(u, t, r, n) for (u, t), (r, n) in abilities.items()])
+
+        cur.executemany("""
+            INSERT INTO item_difficulty (question_id, topic, label, rating, n, correct)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(question_id) DO UPDATE SET
+                rating = excluded.rating,
+                n = excluded.n,
+                correct = excluded.correct
+        """, [(qid, t, label, r, n, c) for qid, (r, n, c, t, label) in items.items()])
+
+    # -------------------------
+    # READS
+    # -------------------------
+    def get_ability(self, student_id, topic):
+        """(rating, answers_seen) for a learner on a topic, or None if unrated."""
+        with connection() as conn:
+            row = conn.execute("""
+                SELECT rating, n FROM learner_ability
+                WHERE user_id = ? AND topic = ?
+            """, (student_id, topic)).fetchone()
+        return row
+
+    def get_item_difficulties(self, question_ids):
+        """{question_id: (rating, answers_seen)} for the answered ones among `question_ids`."""
+        result = {}
+        for chunk in chunked(question_ids):
+            with connection() as conn:
+                rows = conn.execute(f"""
+                    SELECT question_id, rating, n FROM item_difficulty
+                    WHERE question_id IN ({placeholders(len(chunk))})
+                """, chunk).fetchall()
+            result.update((r[0], (r[1], r[2])) for r in rows)
+        return result
+
+    def expected_success(self, ability, difficulty):
+        """1PL P(correct) for a learner of `ability` on an item of `difficulty`."""
+        return sigmoid(ability - difficulty)
+
+    def difficulty_for(self, ability):
+        """Difficulty label whose prior gives success closest to TARGET_SUCCESS."""
+        return min(
+            DIFFICULTY_PRIORS,
+            key=lambda label: abs(
+                self.expected_success(ability, DIFFICULTY_PRIORS[label]) - TARGET_SUCCESS
+            )
+        )
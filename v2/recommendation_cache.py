@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from v2.database import connection, transaction
+
+# -------------------------
+# DEFAULTS
+# -------------------------
+MAX_ENTRIES = 1024
+
+
+class RecommendationCache:
+    """
+    Materialized recommendations per learner, in a bounded in-process LRU.
+
+    An entry is valid while the learner's progress_version is unchanged
+    (no new answer, reset or preference change) and, because review items
+    depend on the clock, until `valid_until` (epoch seconds, None = no
+    expiry). With persist=True entries are also written to the
+    recommendation_cache table, so a restarted process starts warm.
+    Cached lists are shared: treat them as read-only.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, persist=False):
+        self.max_entries = max_entries
+        self.persist = persist
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, student_id, version, at=None):
+        at = at if at is not None else int(time.time())
+
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None and self._valid(entry, version, at):
+                self._entries.move_to_end(student_id)
+                self.hits += 1
+                return entry[2]
+
+        if self.persist:
+            entry = self._load(student_id)
+            if entry is not None and self._valid(entry, version, at):
+                self._remember(student_id, entry)
+                with self._lock:
+                    self.hits += 1
+                return entry[2]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, student_id, version, recommendations, valid_until=None):
+        entry = (version, valid_until, recommendations)
+        self._remember(student_id, entry)
+
+        if self.persist:
+            with transaction() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO recommendation_cache
+                    (user_id, progress_version, valid_until, payload, computed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (
+                    student_id, version, valid_until,
+                    json.dumps(recommendations), int(time.time())
+                ))
+
+    def invalidate(self, student_id):
+        with self._lock:
+            self._entries.pop(student_id, None)
+        if self.persist:
+            with transaction() as conn:
+                conn.execute(
+                    "DELETE FROM recommendation_cache WHERE user_id = ?",
+                    (student_id,)
+                )
+
+    # -------------------------
+    # INTERNALS
+    # -------------------------
+    @staticmethod
+    def _valid(entry, version, at):
+        cached_version, valid_until, _ = entry
+        return cached_version == version and (valid_until is None or at < valid_until)
+
+    def _remember(self, student_id, entry):
+        with self._lock:
+            self._entries[student_id] = entry
+            self._entries.move_to_end(student_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, student_id):
+        with connection() as conn:
+            row = conn.execute("""
+                SELECT progress_version, valid_until, payload
+                FROM recommendation_cache
+                WHERE user_id = ?
+            """, (student_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+
+# -----------------------------
+# SHARED CACHE
+# -----------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_recommendation_cache():
+    """Process-wide recommendation cache (shared by every AdaptiveEngine)."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RecommendationCache()
+    return _cache
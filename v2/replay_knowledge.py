@@ -0,0 +1,146 @@
+"""
+Batch job: rebuild every learner's BKT mastery from the raw `progress`
+table and, with --refit, re-estimate per-skill parameters first.
+
+Each topic is read once in (user, time) order. The topic-wide skill and
+every subtopic skill are then replayed for all learners together with the
+vectorized `replay` / `fit` from v2.knowledge_tracing, and the results are
+bulk-written to knowledge_state (and bkt_params); the topic's persisted
+difficulty levels are dropped so they are re-derived from the new mastery.
+
+Usage:
+    python -m v2.replay_knowledge [--db PATH] [--refit] [--min-answers N]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from v2 import database
+from v2.database import connection, transaction
+from v2.knowledge_tracing import DEFAULT_PARAMS, TOPIC_SKILL, fit, replay
+
+MIN_FIT_ANSWERS = 200
+UPSERT_BATCH = 10_000
+
+STATE_SQL = """
+    INSERT OR REPLACE INTO knowledge_state (user_id, topic, subtopic, p_mastery, n, correct)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+PARAMS_SQL = """
+    INSERT OR REPLACE INTO bkt_params (
+        topic, subtopic, p_init, p_learn, p_slip, p_guess, n_answers, fitted_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _read_topic(topic):
+    """(user_ids, subtopics, correct) arrays for one topic, in (user, time) order."""
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT user_id, COALESCE(subtopic, ''), accuracy = 100
+            FROM progress
+            WHERE topic = ? AND typeof(user_id) = 'integer'
+            ORDER BY user_id, ts, id
+        """, (topic,)).fetchall()
+
+    if not rows:
+        return None
+    users, subtopics, correct = zip(*rows)
+    return np.array(users, dtype=np.int64), np.array(subtopics), np.array(correct, dtype=bool)
+
+
+def _stored_params():
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT topic, subtopic, p_init, p_learn, p_slip, p_guess
+            FROM bkt_params
+        """).fetchall()
+    return {(r[0], r[1]): tuple(r[2:]) for r in rows}
+
+
+def _write(sql, records):
+    # Short write transactions so online writers are not starved
+    for i in range(0, len(records), UPSERT_BATCH):
+        with transaction() as conn:
+            conn.executemany(sql, records[i:i + UPSERT_BATCH])
+
+
+def replay_all(refit=False, min_answers=MIN_FIT_ANSWERS):
+    """Run the job. Returns a stats dict (skills, states, answers, fitted, seconds)."""
+    started = time.perf_counter()
+    params = _stored_params()
+    with connection() as conn:
+        topics = [r[0] for r in conn.execute("SELECT DISTINCT topic FROM progress_rollup")]
+
+    stats = {"skills": 0, "states": 0, "answers": 0, "fitted": 0}
+    fitted_at = int(time.time())
+
+    for topic in topics:
+        data = _read_topic(topic)
+        if data is None:
+            continue
+        users, subtopics, correct = data
+        stats["answers"] += len(users)
+
+        skills = [(TOPIC_SKILL, np.ones(len(users), dtype=bool))]
+        skills += [(s, subtopics == s) for s in np.unique(subtopics) if s != TOPIC_SKILL]
+
+        states, fitted = [], []
+        for skill, mask in skills:
+            skill_users = users[mask]
+            ids, seq = np.unique(skill_users, return_inverse=True)
+            counts = np.bincount(seq)
+            right = np.bincount(seq, weights=correct[mask]).astype(np.int64)
+
+            if refit and mask.sum() >= min_answers:
+                skill_params, mastery = fit(seq, correct[mask])
+                fitted.append((topic, skill) + skill_params + (int(mask.sum()), fitted_at))
+            else:
+                skill_params = params.get((topic, skill), DEFAULT_PARAMS)
+                mastery, _ = replay(seq, correct[mask], *skill_params)
+
+            states.extend(zip(
+                ids.tolist(),
+                [topic] * len(ids),
+                [skill] * len(ids),
+                mastery.tolist(),
+                counts.tolist(),
+                right.tolist()
+            ))
+            stats["skills"] += 1
+
+        _write(PARAMS_SQL, fitted)
+        _write(STATE_SQL, states)
+        # Stored levels may rest on the old mastery; they are re-derived on next read
+        _write("DELETE FROM learner_difficulty WHERE topic = ?", [(topic,)])
+        stats["states"] += len(states)
+        stats["fitted"] += len(fitted)
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay (and optionally refit) BKT mastery.")
+    parser.add_argument("--db", default=database.DB_NAME, help="SQLite database file")
+    parser.add_argument("--refit", action="store_true", help="re-estimate per-skill parameters")
+    parser.add_argument("--min-answers", type=int, default=MIN_FIT_ANSWERS,
+                        help="skills with fewer answers keep their current parameters")
+    args = parser.parse_args(argv)
+
+    database.DB_NAME = args.db
+    database.init_db()
+
+    stats = replay_all(args.refit, args.min_answers)
+    print(
+        f"Replayed {stats['answers']:,} answers into {stats['states']:,} states "
+        f"across {stats['skills']} skills ({stats['fitted']} refitted) "
+        f"in {stats['seconds']:.2f}s"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    main()
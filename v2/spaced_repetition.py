@@ -0,0 +1,146 @@
+import time
+
+from v2.database import connection
+
+# -------------------------
+# SM-2 PARAMETERS
+# -------------------------
+DAY = 86400
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+FIRST_INTERVALS = (1, 6)      # days after the 1st and 2nd successful review
+
+# Response time (seconds) splitting a confident recall from a hesitant one
+FAST_ANSWER = 15
+SLOW_ANSWER = 60
+
+# A card is opened only by an answer graded below this (a miss or a slow,
+# hesitant recall); confident answers don't need scheduled practice
+NEW_CARD_BELOW = 4
+
+# Due reviews may take at most this share of a quiz's questions
+MAX_REVIEW_SHARE = 0.5
+
+
+def review_quota(num_questions):
+    """How many of a quiz's `num_questions` may be due reviews."""
+    return int(num_questions * MAX_REVIEW_SHARE)
+
+
+def grade(correct, response_time):
+    """SM-2 quality 0-5 from correctness and how long the answer took."""
+    if not correct:
+        return 1
+    if response_time is not None and response_time < FAST_ANSWER:
+        return 5
+    if response_time is not None and response_time > SLOW_ANSWER:
+        return 3
+    return 4
+
+
+def sm2(ease, interval, reps, quality):
+    """One SM-2 review. Returns (ease, interval_days, reps, lapsed)."""
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    if quality < 3:
+        return ease, FIRST_INTERVALS[0], 0, True
+
+    if reps < len(FIRST_INTERVALS):
+        interval = FIRST_INTERVALS[reps]
+    else:
+        interval = interval * ease
+    return ease, interval, reps + 1, False
+
+
+class ReviewScheduler:
+    """
+    Spaced-repetition cards, one per (learner, question), in review_cards.
+    A card is opened by a missed or slow answer; from then on every answer
+    to the question reschedules it in O(1); "what is due" is a range scan
+    on the (user_id, due_at) index, so cost follows the number of due
+    cards, not the number of cards.
+    """
+
+    # -------------------------
+    # WRITE PATH
+    # -------------------------
+    def apply_answers(self, conn, rows):
+        """
+        Reschedule cards for answer rows
+        `(user_id, topic, accuracy, response_time, timestamp, ts, question_id, ...)`
+        in order. Rows without a question_id are skipped, as are confident
+        answers to questions without a card. Caller owns the transaction.
+        """
+        cur = conn.cursor()
+        cards = {}
+
+        for user_id, topic, accuracy, response_time, _, ts, question_id, *_ in rows:
+            if question_id is None:
+                continue
+
+            key = (user_id, question_id)
+            if key not in cards:
+                cur.execute("""
+                    SELECT ease, interval_days, reps, lapses FROM review_cards
+                    WHERE user_id = ? AND question_id = ?
+                """, key)
+                cards[key] = cur.fetchone()
+
+            quality = grade(accuracy == 100, response_time)
+            if cards[key] is None:
+                if quality >= NEW_CARD_BELOW:
+                    continue
+                cards[key] = (INITIAL_EASE, 0, 0, 0)
+
+            ease, interval, reps, lapses = cards[key][:4]
+            ease, interval, reps, lapsed = sm2(ease, interval, reps, quality)
+            reviewed_at = ts if ts is not None else int(time.time())
+            cards[key] = (
+                ease, interval, reps, lapses + lapsed,
+                topic, reviewed_at, reviewed_at + int(interval * DAY)
+            )
+
+        cur.executemany("""
+            INSERT OR REPLACE INTO review_cards (
+                user_id, question_id, ease, interval_days, reps, lapses,
+                topic, last_ts, due_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [key + card for key, card in cards.items() if card is not None])
+
+    # -------------------------
+    # READS
+    # -------------------------
+    def due_cards(self, student_id, topic=None, limit=10, at=None):
+        """Question ids due by `at` (default now), most overdue first."""
+        clause, params = "user_id = ?", [student_id]
+        if topic is not None:
+            clause += " AND topic = ?"
+            params.append(topic)
+
+        with connection() as conn:
+            rows = conn.execute(f"""
+                SELECT question_id FROM review_cards
+                WHERE {clause} AND due_at <= ?
+                ORDER BY due_at
+                LIMIT ?
+            """, params + [at if at is not None else int(time.time()), limit]).fetchall()
+        return [r[0] for r in rows]
+
+    def due_counts(self, student_id, at=None):
+        """{topic: number of cards due} for a learner."""
+        with connection() as conn:
+            rows = conn.execute("""
+                SELECT topic, COUNT(*) FROM review_cards
+                WHERE user_id = ? AND due_at <= ?
+                GROUP BY topic
+            """, (student_id, at if at is not None else int(time.time()))).fetchall()
+        return dict(rows)
+
+    def next_due(self, student_id, after=None):
+        """Epoch time the next not-yet-due card becomes due, or None."""
+        with connection() as conn:
+            row = conn.execute("""
+                SELECT MIN(due_at) FROM review_cards
+                WHERE user_id = ? AND due_at > ?
+            """, (student_id, after if after is not None else int(time.time()))).fetchone()
+        return row[0]
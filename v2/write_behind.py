@@ -0,0 +1,196 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from v2.database import transaction
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# DEFAULTS
+# -------------------------
+BATCH_SIZE = 200          # flush once this many rows are buffered
+FLUSH_INTERVAL = 0.05     # ...or this many seconds after the first buffered row
+MAX_QUEUE = 10000         # submit() blocks (back-pressure) beyond this
+MAX_RETRIES = 5
+
+_FLUSH = object()
+_STOP = object()
+
+
+class WriteBehindError(RuntimeError):
+    """Rows submitted for a key could not be written."""
+
+
+class WriteBehindQueue:
+    """
+    Group-commit writer: rows submitted from request threads are buffered in a
+    bounded queue and written by one background thread, many rows per
+    transaction (one fsync per batch instead of one per row).
+
+    `flush_fn(conn, rows)` performs the actual writes inside the transaction.
+    `key_fn(row)` returns the owner (e.g. user id) of a row; `wait_for(key)`
+    blocks until every row already submitted for that owner is committed,
+    which gives callers read-your-writes consistency.
+
+    A batch that fails is split in halves and retried, down to single rows,
+    so one bad row costs only itself; its owner's next wait_for raises
+    WriteBehindError. Waiters must not hold a pooled connection (the writer
+    needs one to make progress).
+    """
+
+    def __init__(
+        self,
+        flush_fn,
+        key_fn,
+        batch_size=BATCH_SIZE,
+        flush_interval=FLUSH_INTERVAL,
+        max_queue=MAX_QUEUE,
+        name="write-behind"
+    ):
+        self.flush_fn = flush_fn
+        self.key_fn = key_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}
+        self._failed = {}
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.rows_written = 0
+        self.batches_written = 0
+        self.rows_failed = 0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    # -------------------------
+    # PRODUCER SIDE
+    # -------------------------
+    def submit(self, row):
+        """Queue a row for writing. Blocks if the queue is full."""
+        if self._closed:
+            raise RuntimeError("write-behind queue is closed")
+
+        key = self.key_fn(row)
+        with self._cond:
+            self._pending[key] = self._pending.get(key, 0) + 1
+        self._queue.put(row)
+
+    def pending(self, key):
+        with self._cond:
+            return self._pending.get(key, 0)
+
+    def wait_for(self, key, timeout=None):
+        """
+        Block until all rows submitted for `key` are written. Returns False on
+        timeout; raises WriteBehindError (once) if any of them were dropped.
+        """
+        with self._cond:
+            done = not self._pending.get(key)
+
+        if not done:
+            # Ask the writer to flush now rather than at the next interval
+            self._queue.put(_FLUSH)
+            with self._cond:
+                done = self._cond.wait_for(lambda: not self._pending.get(key), timeout)
+
+        with self._cond:
+            failed = self._failed.pop(key, 0)
+        if failed:
+            raise WriteBehindError(f"{failed} queued row(s) for {key!r} could not be written")
+        return done
+
+    def close(self, timeout=None):
+        """Stop accepting rows, drain everything queued, stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # -------------------------
+    # WRITER THREAD
+    # -------------------------
+    def _run(self):
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._flush(batch)
+            if stop:
+                return
+
+    def _collect(self):
+        """Gather rows until the batch is full, the interval ends, or a marker arrives."""
+        batch = []
+        item = self._queue.get()
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            if item is _STOP:
+                return batch, True
+            if item is _FLUSH:
+                return batch, False
+
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, False
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return batch, False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, False
+
+    def _flush(self, batch):
+        failed = self._write(batch)
+
+        # Committed (or given up on): release waiters either way
+        with self._cond:
+            for row in failed:
+                key = self.key_fn(row)
+                self._failed[key] = self._failed.get(key, 0) + 1
+            for row in batch:
+                key = self.key_fn(row)
+                left = self._pending.get(key, 0) - 1
+                if left > 0:
+                    self._pending[key] = left
+                else:
+                    self._pending.pop(key, None)
+            self._cond.notify_all()
+
+    def _write(self, rows):
+        """Commit rows, bisecting around failures; returns the rows dropped."""
+        try:
+            self._commit(rows)
+        except Exception:
+            if len(rows) == 1:
+                logger.exception("dropping row for %r", self.key_fn(rows[0]))
+                self.rows_failed += 1
+                return rows
+        else:
+            self.rows_written += len(rows)
+            self.batches_written += 1
+            return []
+
+        # Halves in order: rows still apply in submission order
+        mid = len(rows) // 2
+        return self._write(rows[:mid]) + self._write(rows[mid:])
+
+    def _commit(self, rows):
+        """One transaction; lock contention is retried, bad data fails at once."""
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                with transaction() as conn:
+                    self.flush_fn(conn, rows)
+                return
+            except sqlite3.OperationalError:
+                if attempt == MAX_RETRIES:
+                    raise
+                time.sleep(0.05 * 2 ** attempt)